@@ -50,9 +50,17 @@ class Config(BaseSettings):
     storage_path: Path = Field(default=Path("./storage"), env="STORAGE_PATH")
     storage_bucket: Optional[str] = Field(default=None, env="STORAGE_BUCKET")
     
+    # MongoDB connection pool (GridFS storage)
+    mongo_max_pool_size: int = Field(default=50, ge=1, env="MONGO_MAX_POOL_SIZE")
+    mongo_min_pool_size: int = Field(default=5, ge=0, env="MONGO_MIN_POOL_SIZE")
+    
     # Cloudinary Configuration
     cloudinary_url: Optional[str] = Field(default=None, env="CLOUDINARY_URL")
     
+    # Report Access Tokens
+    report_token_secret: Optional[str] = Field(default=None, env="REPORT_TOKEN_SECRET")
+    file_url_secret: Optional[str] = Field(default=None, env="FILE_URL_SECRET")
+    
     # Medical Compliance
     medical_disclaimer_enabled: bool = Field(default=True, env="MEDICAL_DISCLAIMER_ENABLED")
     phi_redaction_enabled: bool = Field(default=True, env="PHI_REDACTION_ENABLED")
@@ -1,9 +1,110 @@
 """Medical prompt templates for Groq API interactions."""
 
+from functools import lru_cache
+from pathlib import Path
 from typing import Dict, List, Any, Optional
+import json
 import re
 
 
+# PHI patterns used by prompt safety validation; each kind maps to the warning
+# reported when it is present.
+_PHI_PATTERNS = {
+    "name": re.compile(r'\b[A-Z][a-z]+ [A-Z][a-z]+\b'),
+    "phone": re.compile(r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b'),
+    "email": re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    "date": re.compile(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b'),
+    "id": re.compile(r'\b\d{6,}\b'),
+}
+_PHI_WARNINGS = {
+    "name": "Potential names detected",
+    "phone": "Potential phone numbers detected",
+    "email": "Potential email addresses detected",
+    "date": "Potential dates detected",
+    "id": "Potential ID numbers detected",
+}
+
+# Overconfident wording that should not appear in medical content. Matched at the
+# start of a word only, so inflections ("cured", "cures") still count but words
+# merely containing a phrase ("secure") do not. The word-start check runs on the
+# lowered prompt, and only once a plain substring test has found the phrase.
+_CONCERNING_PHRASES = {
+    phrase: re.compile(r'\b' + re.escape(phrase))
+    for phrase in ("definitely", "certainly", "guaranteed", "cure", "always works")
+}
+
+# Fixed sections appended by enhance_prompt_with_safety_measures
+_SAFETY_REQUIREMENTS_HEADER = "\n\nMEDICAL SAFETY REQUIREMENTS:\n"
+_PROFESSIONAL_JUDGMENT_NOTICE = (
+    "\nPROFESSIONAL JUDGMENT REQUIRED: This automated analysis supports but does not "
+    "replace professional medical evaluation and clinical decision-making."
+)
+
+# Static patient education content, keyed by finding type
+_EDUCATION_CONTENT_FILE = Path(__file__).with_name("education_content.json")
+
+
+@lru_cache(maxsize=1)
+def _load_education_content() -> Dict[str, Dict[str, str]]:
+    """Load education content once; callers only ever receive copies of it."""
+    with open(_EDUCATION_CONTENT_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Comprehensive patterns for PHI detection and redaction, compiled once
+_REDACTION_PATTERNS = [
+    (re.compile(pattern, re.IGNORECASE), replacement)
+    for pattern, replacement in [
+        # Names (various formats) - more specific to avoid false positives
+        (r'\b(?:Mr|Mrs|Ms|Dr|Doctor|Patient)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?\b', '[NAME]'),
+        (r'\b[A-Z][a-z]+,\s*[A-Z][a-z]+\b', '[NAME]'),
+        # Full names (first and last) - only match clear name patterns
+        (r'\b([A-Z][a-z]{2,})\s+([A-Z][a-z]{2,})\s+(has|reports|experienced|complained|stated|mentioned|said)\b', '[NAME] \\3'),
+        (r'\b(?:Patient|Mr|Mrs|Ms)\s+[A-Z][a-z]{2,}\s+[A-Z][a-z]{2,}\b', '[NAME]'),
+
+        # Contact Information
+        (r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b', '[PHONE]'),
+        (r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]'),
+
+        # Dates and Times
+        (r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', '[DATE]'),
+        (r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b', '[DATE]'),
+        (r'\b\d{1,2}:\d{2}(?::\d{2})?\s*(?:AM|PM|am|pm)?\b', '[TIME]'),
+
+        # Medical Identifiers
+        (r'\b(?:SSN|Social Security):?\s*\d{3}-?\d{2}-?\d{4}\b', '[SSN]'),
+        (r'\b(?:MRN|Medical Record|Patient ID):?\s*\d+\b', '[MRN]'),
+        (r'\b(?:DOB|Date of Birth):?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', '[DOB]'),
+        (r'\b(?:Insurance|Policy)\s*(?:Number|ID)?:?\s*[A-Z0-9]+\b', '[INSURANCE]'),
+
+        # Addresses
+        (r'\b\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Drive|Dr|Lane|Ln|Boulevard|Blvd|Circle|Cir|Court|Ct|Place|Pl)\b', '[ADDRESS]'),
+        (r'\b[A-Za-z\s]+,\s*[A-Z]{2}\s+\d{5}(?:-\d{4})?\b', '[ADDRESS]'),
+
+        # Age and specific dates that could be identifying
+        (r'\b(?:age|aged)\s+\d{1,3}\b', '[AGE]'),
+        (r'\b\d{1,3}\s*(?:years?\s*old|y\.?o\.?)\b', '[AGE]'),
+
+        # Hospital/Facility names (common patterns)
+        (r'\b[A-Z][a-z]+\s+(?:Hospital|Medical Center|Clinic|Healthcare|Health System)\b', '[FACILITY]'),
+
+        # Provider names and credentials
+        (r'\bDr\.?\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?\b', '[PROVIDER]'),
+        (r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?,\s*(?:MD|DO|NP|PA|RN)\b', '[PROVIDER]'),
+    ]
+]
+
+# Remaining digit sequences that might be IDs (but preserve medical values)
+_ID_SEQUENCE_RE = re.compile(r'\b(?<![\d.])\d{6,}(?![\d.])\b')
+
+# Matches wherever redact_phi would rewrite something, without building a copy
+_REDACTION_DETECTOR = re.compile(
+    '|'.join(f'(?:{pattern.pattern})' for pattern, _ in _REDACTION_PATTERNS)
+    + f'|{_ID_SEQUENCE_RE.pattern}',
+    re.IGNORECASE
+)
+
+
 class MedicalPromptTemplates:
     """Collection of medical prompt templates with PHI redaction and safety measures."""
     
@@ -36,53 +137,13 @@ class MedicalPromptTemplates:
         if not text:
             return text
         
-        # Comprehensive patterns for PHI detection and redaction
-        patterns = [
-            # Names (various formats) - more specific to avoid false positives
-            (r'\b(?:Mr|Mrs|Ms|Dr|Doctor|Patient)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?\b', '[NAME]'),
-            (r'\b[A-Z][a-z]+,\s*[A-Z][a-z]+\b', '[NAME]'),
-            # Full names (first and last) - only match clear name patterns
-            (r'\b([A-Z][a-z]{2,})\s+([A-Z][a-z]{2,})\s+(has|reports|experienced|complained|stated|mentioned|said)\b', '[NAME] \\3'),
-            (r'\b(?:Patient|Mr|Mrs|Ms)\s+[A-Z][a-z]{2,}\s+[A-Z][a-z]{2,}\b', '[NAME]'),
-            
-            # Contact Information
-            (r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b', '[PHONE]'),
-            (r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]'),
-            
-            # Dates and Times
-            (r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', '[DATE]'),
-            (r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b', '[DATE]'),
-            (r'\b\d{1,2}:\d{2}(?::\d{2})?\s*(?:AM|PM|am|pm)?\b', '[TIME]'),
-            
-            # Medical Identifiers
-            (r'\b(?:SSN|Social Security):?\s*\d{3}-?\d{2}-?\d{4}\b', '[SSN]'),
-            (r'\b(?:MRN|Medical Record|Patient ID):?\s*\d+\b', '[MRN]'),
-            (r'\b(?:DOB|Date of Birth):?\s*\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', '[DOB]'),
-            (r'\b(?:Insurance|Policy)\s*(?:Number|ID)?:?\s*[A-Z0-9]+\b', '[INSURANCE]'),
-            
-            # Addresses
-            (r'\b\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Drive|Dr|Lane|Ln|Boulevard|Blvd|Circle|Cir|Court|Ct|Place|Pl)\b', '[ADDRESS]'),
-            (r'\b[A-Za-z\s]+,\s*[A-Z]{2}\s+\d{5}(?:-\d{4})?\b', '[ADDRESS]'),
-            
-            # Age and specific dates that could be identifying
-            (r'\b(?:age|aged)\s+\d{1,3}\b', '[AGE]'),
-            (r'\b\d{1,3}\s*(?:years?\s*old|y\.?o\.?)\b', '[AGE]'),
-            
-            # Hospital/Facility names (common patterns)
-            (r'\b[A-Z][a-z]+\s+(?:Hospital|Medical Center|Clinic|Healthcare|Health System)\b', '[FACILITY]'),
-            
-            # Provider names and credentials
-            (r'\bDr\.?\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?\b', '[PROVIDER]'),
-            (r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?,\s*(?:MD|DO|NP|PA|RN)\b', '[PROVIDER]'),
-        ]
         
         redacted_text = text
-        for pattern, replacement in patterns:
-            redacted_text = re.sub(pattern, replacement, redacted_text, flags=re.IGNORECASE)
+        for pattern, replacement in _REDACTION_PATTERNS:
+            redacted_text = pattern.sub(replacement, redacted_text)
         
         # Additional sanitization - remove any remaining sequences that look like identifiers
-        # Remove sequences of digits that might be IDs (but preserve medical values)
-        redacted_text = re.sub(r'\b(?<![\d.])\d{6,}(?![\d.])\b', '[ID]', redacted_text)
+        redacted_text = _ID_SEQUENCE_RE.sub('[ID]', redacted_text)
         
         # Log redaction for audit purposes (without showing original content)
         if redacted_text != text:
@@ -91,6 +152,19 @@ class MedicalPromptTemplates:
         
         return redacted_text
     
+    @staticmethod
+    def contains_phi(text: str) -> bool:
+        """
+        Check whether redact_phi would alter the text, stopping at the first match.
+        
+        Args:
+            text: Input text that may contain PHI
+            
+        Returns:
+            True if potential PHI is present
+        """
+        return bool(text) and _REDACTION_DETECTOR.search(text) is not None
+    
     @classmethod
     def get_triage_system_prompt(cls) -> str:
         """Get enhanced system prompt for orthopedic triage assessment."""
@@ -619,8 +693,9 @@ FRACTURE STABILITY ASSESSMENT:
 """
     
     @classmethod
+    @lru_cache(maxsize=8)
     def get_medical_disclaimer_variations(cls, urgency_level: str) -> str:
-        """Get urgency-appropriate medical disclaimers."""
+        """Get urgency-appropriate medical disclaimers (memoized per urgency level)."""
         
         disclaimers = {
             "RED": f"""
@@ -647,31 +722,7 @@ ROUTINE CARE NOTICE: While this automated analysis suggests no urgent concerns,
     @classmethod
     def get_patient_education_content(cls, finding_type: str) -> Dict[str, str]:
         """Get patient education content for common orthopedic findings."""
-        
-        education_content = {
-            "fracture": {
-                "what_it_is": "A fracture is a break in the bone. Bones are living tissue that can heal when properly treated.",
-                "healing_process": "Bone healing typically occurs in stages over several weeks to months, depending on the location and severity.",
-                "factors_affecting_healing": "Age, nutrition, smoking, and following medical advice all affect how well bones heal.",
-                "activity_expectations": "Your doctor will guide you on when you can return to normal activities safely."
-            },
-            
-            "no_fracture": {
-                "what_it_means": "No broken bones were detected in your X-ray, which is good news.",
-                "other_possibilities": "Soft tissue injuries like sprains or strains don't always show on X-rays but can still cause pain.",
-                "when_symptoms_persist": "If pain or other symptoms continue, follow up with your healthcare provider for further evaluation.",
-                "normal_healing": "Soft tissue injuries often heal with rest, ice, and gradual return to activity."
-            },
-            
-            "stress_fracture": {
-                "what_it_is": "A stress fracture is a small crack in the bone caused by repeated stress or overuse.",
-                "common_causes": "Often occurs in athletes or people who suddenly increase their activity level.",
-                "healing_approach": "Usually heals well with rest and gradual return to activity as guided by your doctor.",
-                "prevention": "Proper training progression and adequate rest can help prevent future stress fractures."
-            }
-        }
-        
-        return education_content.get(finding_type, {})
+        return dict(_load_education_content().get(finding_type, {}))
     
     @classmethod
     def validate_prompt_safety(cls, prompt: str) -> Dict[str, Any]:
@@ -699,32 +750,23 @@ ROUTINE CARE NOTICE: While this automated analysis suggests no urgent concerns,
             validation_result["warnings"].append("Medical disclaimer not found")
             validation_result["recommendations"].append("Add medical disclaimer to all medical content")
         
-        # Check for potential PHI patterns
-        phi_patterns = [
-            (r'\b[A-Z][a-z]+ [A-Z][a-z]+\b', "Potential names detected"),
-            (r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b', "Potential phone numbers detected"),
-            (r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', "Potential email addresses detected"),
-            (r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', "Potential dates detected"),
-            (r'\b\d{6,}\b', "Potential ID numbers detected")
-        ]
-        
-        for pattern, warning in phi_patterns:
-            if re.search(pattern, prompt):
+        # Check for potential PHI patterns; each search stops at its first hit
+        for group, pattern in _PHI_PATTERNS.items():
+            if pattern.search(prompt):
                 validation_result["phi_detected"] = True
-                validation_result["warnings"].append(warning)
+                validation_result["warnings"].append(_PHI_WARNINGS[group])
                 validation_result["recommendations"].append("Apply PHI redaction before using prompt")
         
+        # Lowered once and shared by the case-insensitive checks below
+        lowered = prompt.lower()
+        
         # Check for emergency guidance in patient-facing content
-        if "patient" in prompt.lower() and cls.EMERGENCY_WARNING not in prompt:
+        if "patient" in lowered and cls.EMERGENCY_WARNING not in prompt:
             validation_result["recommendations"].append("Consider adding emergency guidance for patient-facing content")
         
         # Check for appropriate medical language
-        concerning_phrases = [
-            "definitely", "certainly", "guaranteed", "cure", "always works"
-        ]
-        
-        for phrase in concerning_phrases:
-            if phrase in prompt.lower():
+        for phrase, word_start in _CONCERNING_PHRASES.items():
+            if phrase in lowered and word_start.search(lowered):
                 validation_result["warnings"].append(f"Potentially inappropriate medical language: '{phrase}'")
                 validation_result["recommendations"].append("Use more cautious medical language")
         
@@ -746,8 +788,8 @@ ROUTINE CARE NOTICE: While this automated analysis suggests no urgent concerns,
         Returns:
             Enhanced prompt with safety measures
         """
-        # Apply PHI redaction
-        safe_prompt = cls.redact_phi(prompt)
+        # Apply PHI redaction only when something would actually be redacted
+        safe_prompt = cls.redact_phi(prompt) if cls.contains_phi(prompt) else prompt
         
         # Add appropriate medical disclaimer
         disclaimer = cls.get_medical_disclaimer_variations(urgency_level)
@@ -757,14 +799,14 @@ ROUTINE CARE NOTICE: While this automated analysis suggests no urgent concerns,
         if "patient" in prompt.lower():
             emergency_section = f"\n\nEMERGENCY GUIDANCE:\n{cls.EMERGENCY_WARNING}\n"
         
-        # Combine all elements
-        enhanced_prompt = f"""{safe_prompt}
-
-MEDICAL SAFETY REQUIREMENTS:
-{disclaimer}{emergency_section}
-PROFESSIONAL JUDGMENT REQUIRED: This automated analysis supports but does not replace professional medical evaluation and clinical decision-making."""
-        
-        return enhanced_prompt
+        # Combine all elements in a single allocation
+        return "".join((
+            safe_prompt,
+            _SAFETY_REQUIREMENTS_HEADER,
+            disclaimer,
+            emergency_section,
+            _PROFESSIONAL_JUDGMENT_NOTICE,
+        ))
     
     @classmethod
     def get_audit_safe_prompt_summary(cls, prompt_type: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
@@ -788,12 +830,9 @@ PROFESSIONAL JUDGMENT REQUIRED: This automated analysis supports but does not re
         
         # Check if PHI redaction was needed (without exposing the PHI)
         if parameters:
-            for key, value in parameters.items():
-                if isinstance(value, str) and value:
-                    original_value = value
-                    redacted_value = cls.redact_phi(value)
-                    if original_value != redacted_value:
-                        safe_summary["phi_redaction_applied"] = True
-                        break
+            for value in parameters.values():
+                if isinstance(value, str) and cls.contains_phi(value):
+                    safe_summary["phi_redaction_applied"] = True
+                    break
         
         return safe_summary
\ No newline at end of file
@@ -1,11 +1,13 @@
 """Security and authorization services for the orthopedic assistant."""
 
+import base64
 import hashlib
 import hmac
+import re
 import secrets
 import time
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timezone, timedelta
+from collections import deque
+from typing import Deque, Dict, Any, Optional, Tuple
 from uuid import UUID
 from loguru import logger
 
@@ -13,6 +15,22 @@ from app.config import config
 from services.error_handler import ValidationError, ErrorCode
 
 
+# Any alphanumeric character (same set as str.isalnum), checked in C
+_HAS_ALNUM_RE = re.compile(r'[^\W_]')
+
+# Error message redaction patterns
+_UNIX_PATH_RE = re.compile(r'/[^\s]+')
+_WINDOWS_PATH_RE = re.compile(r'C:\\[^\s]+')
+_TOKEN_LIKE_RE = re.compile(r'\b[a-zA-Z0-9]{16,}\b')
+
+# Processing modes accepted by the analyze endpoint
+_VALID_MODES = frozenset(("auto", "guided", "advanced"))
+
+# Upper bound on a report token's expiry field; epoch seconds need 10-11 digits,
+# and the cap keeps int() away from huge attacker-supplied digit strings
+_MAX_EXPIRY_DIGITS = 12
+
+
 class SecurityError(Exception):
     """Base security error."""
     
@@ -45,31 +63,69 @@ class DataSanitizer:
         "groq_api_key", "aws_access_key", "aws_secret_access_key"
     ]
     
+    # Combined pattern set, built once at class definition
+    _ALL_SENSITIVE_PATTERNS = tuple(PHI_PATTERNS) + tuple(SENSITIVE_CONFIG_KEYS)
+    
+    # Precompiled key matchers so each key is scanned once instead of per pattern
+    _PHI_KEY_RE = re.compile('|'.join(re.escape(p) for p in PHI_PATTERNS))
+    _SENSITIVE_KEY_RE = re.compile('|'.join(re.escape(p) for p in _ALL_SENSITIVE_PATTERNS))
+    
     @classmethod
     def sanitize_for_logging(cls, data: Any) -> Any:
         """Sanitize data for safe logging (removes PHI and secrets)."""
-        if isinstance(data, dict):
-            sanitized = {}
-            for key, value in data.items():
-                key_lower = key.lower()
-                
-                # Check if key contains sensitive patterns
-                if any(pattern in key_lower for pattern in cls.PHI_PATTERNS + cls.SENSITIVE_CONFIG_KEYS):
-                    sanitized[key] = "[REDACTED]"
-                else:
-                    sanitized[key] = cls.sanitize_for_logging(value)
-            return sanitized
+        if not isinstance(data, (dict, list)):
+            return cls._sanitize_value(data)
         
-        elif isinstance(data, list):
-            return [cls.sanitize_for_logging(item) for item in data]
+        # Walk nested containers with an explicit stack instead of recursion so
+        # deeply nested payloads cannot exhaust the interpreter stack. Containers
+        # are visited once, so self-referencing payloads cannot loop forever.
+        root = {} if isinstance(data, dict) else []
+        stack = deque([(root, data)])
+        seen = {id(data)}
         
-        elif isinstance(data, bytes):
+        while stack:
+            target, source = stack.pop()
+            
+            if isinstance(source, dict):
+                for key, value in source.items():
+                    # Check if key contains sensitive patterns
+                    if cls._SENSITIVE_KEY_RE.search(key.lower()):
+                        target[key] = "[REDACTED]"
+                    elif isinstance(value, (dict, list)):
+                        if id(value) in seen:
+                            target[key] = "[CIRCULAR]"
+                            continue
+                        seen.add(id(value))
+                        child = {} if isinstance(value, dict) else []
+                        target[key] = child
+                        stack.append((child, value))
+                    else:
+                        target[key] = cls._sanitize_value(value)
+            else:
+                for item in source:
+                    if isinstance(item, (dict, list)):
+                        if id(item) in seen:
+                            target.append("[CIRCULAR]")
+                            continue
+                        seen.add(id(item))
+                        child = {} if isinstance(item, dict) else []
+                        target.append(child)
+                        stack.append((child, item))
+                    else:
+                        target.append(cls._sanitize_value(item))
+        
+        return root
+    
+    @classmethod
+    def _sanitize_value(cls, data: Any) -> Any:
+        """Sanitize a single non-container value for logging."""
+        if isinstance(data, bytes):
             # Handle binary data (like images) - don't try to decode as UTF-8
             return f"[BINARY_DATA:{len(data)}bytes]"
         
         elif isinstance(data, str):
             # Redact potential API keys or tokens
-            if len(data) > 20 and any(char.isalnum() for char in data):
+            if len(data) > 20 and _HAS_ALNUM_RE.search(data):
                 # Looks like it could be an API key
                 return f"[REDACTED:{len(data)}chars]"
             return data
@@ -88,14 +144,11 @@ class DataSanitizer:
                 return str(error_message)
         
         # Remove file paths that might contain sensitive info
-        import re
-        
-        # Remove absolute paths
-        error_message = re.sub(r'/[^\s]+', '[PATH_REDACTED]', error_message)
-        error_message = re.sub(r'C:\\[^\s]+', '[PATH_REDACTED]', error_message)
+        error_message = _UNIX_PATH_RE.sub('[PATH_REDACTED]', error_message)
+        error_message = _WINDOWS_PATH_RE.sub('[PATH_REDACTED]', error_message)
         
         # Remove potential API keys or tokens in error messages (alphanumeric strings > 15 chars)
-        error_message = re.sub(r'\b[a-zA-Z0-9]{16,}\b', '[TOKEN_REDACTED]', error_message)
+        error_message = _TOKEN_LIKE_RE.sub('[TOKEN_REDACTED]', error_message)
         
         return error_message
     
@@ -107,7 +160,7 @@ class DataSanitizer:
         for key, value in data.items():
             # Check for PHI in request data
             key_lower = key.lower()
-            if any(pattern in key_lower for pattern in cls.PHI_PATTERNS):
+            if cls._PHI_KEY_RE.search(key_lower):
                 logger.warning(f"Potential PHI detected in request field: {key}")
                 # Don't include PHI fields in processed data
                 continue
@@ -126,27 +179,36 @@ class DataSanitizer:
 
 
 class ReportAuthorizer:
-    """Handles authorization for report access."""
+    """Handles authorization for report access.
+    
+    Access tokens are stateless: each token carries its expiry epoch and an
+    HMAC-SHA256 signature over the report id and expiry, so validation needs
+    no server-side token store.
+    """
     
     def __init__(self):
-        self.access_tokens: Dict[str, Dict[str, Any]] = {}
         self.token_expiry_hours = 24
+        self._expiry_seconds = self.token_expiry_hours * 3600
+        # Shared signing key lets tokens survive restarts and work across workers;
+        # without one, a per-process key is generated and tokens die with the process
+        configured_secret = getattr(config, "report_token_secret", None)
+        self._secret = configured_secret.encode() if configured_secret else secrets.token_bytes(32)
+        # Keyed HMAC state is set up once and copied per token
+        self._mac_template = hmac.new(self._secret, digestmod=hashlib.sha256)
+    
+    def _sign(self, pdf_id: str, expires_at_epoch: int) -> str:
+        """Compute the URL-safe signature for a report id and expiry."""
+        mac = self._mac_template.copy()
+        mac.update(f"{pdf_id}|{expires_at_epoch}".encode())
+        digest = mac.digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
     
     def generate_access_token(self, request_id: UUID, pdf_id: str) -> str:
         """Generate a secure access token for report access."""
-        # Create token payload
-        payload = {
-            "request_id": str(request_id),
-            "pdf_id": pdf_id,
-            "issued_at": datetime.now(timezone.utc).isoformat(),
-            "expires_at": (datetime.now(timezone.utc) + timedelta(hours=self.token_expiry_hours)).isoformat()
-        }
-        
-        # Generate secure token
-        token = secrets.token_urlsafe(32)
+        expires_at_epoch = int(time.time()) + self._expiry_seconds
         
-        # Store token with payload
-        self.access_tokens[token] = payload
+        # Token format: "<expires_at_epoch>.<signature>"
+        token = f"{expires_at_epoch}.{self._sign(pdf_id, expires_at_epoch)}"
         
         logger.info(f"Generated access token for report {pdf_id} (request: {request_id})")
         return token
@@ -165,31 +227,29 @@ class ReportAuthorizer:
             # In production, this would check against user sessions, permissions, etc.
             
             if token:
-                # Validate token if provided
-                if token not in self.access_tokens:
+                # Validate token structure and signature (constant-time compare)
+                expiry_part, _, signature = token.partition(".")
+                if (not (expiry_part.isascii() and expiry_part.isdigit())
+                        or len(expiry_part) > _MAX_EXPIRY_DIGITS or not signature):
                     raise AuthorizationError(
                         "Invalid or expired access token",
                         "INVALID_ACCESS_TOKEN"
                     )
                 
-                token_data = self.access_tokens[token]
+                expires_at_epoch = int(expiry_part)
+                expected = self._sign(pdf_id, expires_at_epoch)
+                if not hmac.compare_digest(expected.encode(), signature.encode()):
+                    raise AuthorizationError(
+                        "Access token not valid for this report",
+                        "INVALID_ACCESS_TOKEN"
+                    )
                 
                 # Check if token is expired
-                expires_at = datetime.fromisoformat(token_data["expires_at"].replace('Z', '+00:00'))
-                if datetime.now(timezone.utc) > expires_at:
-                    # Clean up expired token
-                    del self.access_tokens[token]
+                if time.time() > expires_at_epoch:
                     raise AuthorizationError(
                         "Access token has expired",
                         "TOKEN_EXPIRED"
                     )
-                
-                # Check if token is for the requested report
-                if token_data["pdf_id"] != pdf_id:
-                    raise AuthorizationError(
-                        "Access token not valid for this report",
-                        "TOKEN_MISMATCH"
-                    )
             
             return True
             
@@ -201,22 +261,6 @@ class ReportAuthorizer:
                 "Failed to validate report access",
                 "AUTHORIZATION_VALIDATION_ERROR"
             )
-    
-    def cleanup_expired_tokens(self):
-        """Clean up expired access tokens."""
-        current_time = datetime.now(timezone.utc)
-        expired_tokens = []
-        
-        for token, data in self.access_tokens.items():
-            expires_at = datetime.fromisoformat(data["expires_at"].replace('Z', '+00:00'))
-            if current_time > expires_at:
-                expired_tokens.append(token)
-        
-        for token in expired_tokens:
-            del self.access_tokens[token]
-        
-        if expired_tokens:
-            logger.info(f"Cleaned up {len(expired_tokens)} expired access tokens")
 
 
 class RequestValidator:
@@ -230,7 +274,28 @@ class RequestValidator:
     }
     
     def __init__(self):
-        self.request_history: Dict[str, List[float]] = {}
+        self.request_history: Dict[str, Deque[float]] = {}
+        # Flattened {endpoint: (window_seconds, max_requests)} for the hot path
+        self._rate_limit_table: Dict[str, Tuple[int, int]] = {
+            endpoint: (cfg["window_minutes"] * 60, cfg["requests"])
+            for endpoint, cfg in self.RATE_LIMITS.items()
+        }
+        # Idle clients are swept once per longest window so history stays bounded
+        self._max_window_seconds = max(
+            window_seconds for window_seconds, _ in self._rate_limit_table.values()
+        )
+        self._next_sweep = time.time() + self._max_window_seconds
+    
+    def _sweep_idle_clients(self, current_time: float) -> None:
+        """Drop clients whose most recent request is outside every rate-limit window."""
+        cutoff = current_time - self._max_window_seconds
+        idle_clients = [
+            client_id for client_id, history in self.request_history.items()
+            if not history or history[-1] <= cutoff
+        ]
+        for client_id in idle_clients:
+            del self.request_history[client_id]
+        self._next_sweep = current_time + self._max_window_seconds
     
     def validate_analyze_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and sanitize analyze request."""
@@ -251,11 +316,10 @@ class RequestValidator:
                     raise ValidationError("image_url must be a non-empty string when provided", ErrorCode.INVALID_REQUEST_FORMAT)
             
             # Validate mode
-            valid_modes = ["auto", "guided", "advanced"]
             mode = sanitized.get("mode", "auto")
-            if mode not in valid_modes:
+            if not isinstance(mode, str) or mode not in _VALID_MODES:
                 raise SecurityError(
-                    f"Invalid processing mode. Must be one of: {valid_modes}",
+                    f"Invalid processing mode. Must be one of: {sorted(_VALID_MODES)}",
                     "INVALID_PROCESSING_MODE"
                 )
             
@@ -290,21 +354,23 @@ class RequestValidator:
             current_time = time.time()
             
             # Get rate limit config for endpoint
-            if endpoint not in self.RATE_LIMITS:
+            limit_config = self._rate_limit_table.get(endpoint)
+            if limit_config is None:
                 return True  # No rate limit configured
             
-            limit_config = self.RATE_LIMITS[endpoint]
-            window_seconds = limit_config["window_minutes"] * 60
-            max_requests = limit_config["requests"]
+            window_seconds, max_requests = limit_config
             
-            # Initialize client history if needed
-            if client_id not in self.request_history:
-                self.request_history[client_id] = []
+            if current_time >= self._next_sweep:
+                self._sweep_idle_clients(current_time)
             
-            # Clean old requests outside the window
-            client_requests = self.request_history[client_id]
-            client_requests[:] = [req_time for req_time in client_requests 
-                                if current_time - req_time < window_seconds]
+            # Evict requests outside the window; timestamps are appended in
+            # order so expired entries are always at the head
+            client_requests = self.request_history.get(client_id)
+            if client_requests is None:
+                client_requests = self.request_history[client_id] = deque()
+            cutoff = current_time - window_seconds
+            while client_requests and client_requests[0] <= cutoff:
+                client_requests.popleft()
             
             # Check if within limit
             if len(client_requests) >= max_requests:
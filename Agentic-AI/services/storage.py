@@ -1,13 +1,22 @@
 """Storage service for managing files and artifacts using MongoDB GridFS and local filesystem."""
 
 import os
+import re
+import base64
+import json
 import hashlib
-from typing import Dict, Any, Optional, BinaryIO, Union
+import hmac
+import secrets
+import shutil
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, BinaryIO, Tuple, Union
 from pathlib import Path
 from uuid import uuid4
-from datetime import datetime, timedelta
+from datetime import datetime
 from loguru import logger
-import io
 
 try:
     import pymongo
@@ -23,6 +32,101 @@ except ImportError:
     NoFile = Exception
 
 
+# Read size used when streaming uploads from a file-like source
+_STREAM_CHUNK_SIZE = 1 << 20
+
+# GridFS chunk size; 1 MiB instead of the 255 KiB default means ~4x fewer
+# chunk documents (and insert round trips) per image or report
+_GRIDFS_CHUNK_SIZE = 1 << 20
+
+
+# Upper bound on concurrent writes issued by store_files; the pool is shared by
+# all calls and only starts threads once work is submitted
+_MAX_PARALLEL_STORES = 8
+_store_executor = ThreadPoolExecutor(max_workers=_MAX_PARALLEL_STORES, thread_name_prefix="storage-write")
+
+# How long GridFS document counts are reused by get_storage_info; monitoring scrapes
+# poll often and count_documents on a large collection is slow
+_COUNT_CACHE_TTL_SECONDS = 5.0
+
+# File IDs are generated as "file-{file_type}-{hex}-{timestamp}", which locates the
+# storage directory without scanning
+_FILE_ID_RE = re.compile(r'^file-(?P<file_type>raw|annotated|report|manifest)-[0-9a-f]+-\d+$')
+
+# GridFS collection (bucket) name for each file type
+_GRIDFS_COLLECTIONS = {
+    "raw": "raw",
+    "annotated": "annotated",
+    "report": "reports",
+    "manifest": "manifests"
+}
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _parse_file_type(file_id: str) -> Optional[str]:
+    """Extract the file type encoded in a generated file ID, if it has one."""
+    match = _FILE_ID_RE.match(file_id)
+    return match.group("file_type") if match else None
+
+
+# Extensions tried, most common first, before falling back to a directory glob
+_LOCAL_EXTENSIONS = ("jpg", "png", "pdf", "json", "jpeg", "txt")
+
+# Signed file URL tokens carry a truncated keyed BLAKE2b MAC
+_URL_MAC_SIZE = 16
+
+# MIME types by lowercase extension (no dot)
+_CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'pdf': 'application/pdf',
+    'json': 'application/json',
+    'txt': 'text/plain'
+}
+
+
+class _BufferReader:
+    """read() over an in-memory buffer that copies only each requested slice.
+    
+    Unlike io.BytesIO, wrapping a bytearray or memoryview does not copy the
+    whole upload up front.
+    """
+    
+    def __init__(self, data: Union[bytes, bytearray, memoryview]):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        chunk = bytes(self._view[self._pos:end])
+        self._pos = end
+        return chunk
+
+
+class _HashingReader:
+    """File-like wrapper that hashes and counts bytes as they are read."""
+    
+    def __init__(self, source: BinaryIO):
+        self._source = source
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._source.read(size)
+        if chunk:
+            self.sha256.update(chunk)
+            self.size += len(chunk)
+        return chunk
+
+
 class StorageService:
     """Service for managing file storage (local filesystem or MongoDB GridFS)."""
     
@@ -34,23 +138,53 @@ class StorageService:
             self.storage_path = config.storage_path
             self.mongodb_uri = getattr(config, 'mongodb_uri', None)
             self.mongodb_database = getattr(config, 'mongodb_database', 'orthopedic_assistant')
+            self.mongo_max_pool_size = getattr(config, 'mongo_max_pool_size', 50)
+            self.mongo_min_pool_size = getattr(config, 'mongo_min_pool_size', 5)
+            self.file_url_secret = getattr(config, 'file_url_secret', None)
         except:
             # Fallback for testing
             self.storage_type = "local"
             self.storage_path = Path("./storage")
             self.mongodb_uri = "mongodb://localhost:27017"
             self.mongodb_database = "orthopedic_assistant"
+            self.mongo_max_pool_size = 50
+            self.mongo_min_pool_size = 5
+            self.file_url_secret = None
+        
+        # Without a configured secret, signed URLs only validate within this process.
+        # BLAKE2b keys are at most 64 bytes, so configured secrets are hashed down.
+        url_key = (
+            hashlib.sha256(self.file_url_secret.encode()).digest()
+            if self.file_url_secret else secrets.token_bytes(32)
+        )
+        self._url_mac_template = hashlib.blake2b(key=url_key, digest_size=_URL_MAC_SIZE)
         
         self.mongo_client = None
-        self.gridfs_collections = {}
+        self._gridfs_collections: Optional[Dict[str, Any]] = None
+        self._mongo_setup_lock = threading.Lock()
+        self._file_counts: Counter = Counter()
+        self._count_lock = threading.Lock()
+        self._mongo_counts: Optional[Dict[str, int]] = None
+        self._mongo_counts_expire = 0.0
         
+        # MongoDB connects on first use of gridfs_collections
         if self.storage_type == "local":
             self._setup_local_storage()
-        elif self.storage_type == "mongodb":
-            self._setup_mongodb_storage()
         
         logger.info(f"Storage service initialized: {self.storage_type}")
     
+    @property
+    def gridfs_collections(self) -> Dict[str, Any]:
+        """GridFS buckets by file type, connecting to MongoDB on first access."""
+        if self._gridfs_collections is None:
+            with self._mongo_setup_lock:
+                if self._gridfs_collections is None:
+                    if self.storage_type == "mongodb":
+                        self._gridfs_collections = self._setup_mongodb_storage()
+                    else:
+                        self._gridfs_collections = {}
+        return self._gridfs_collections
+    
     def _setup_local_storage(self) -> None:
         """Setup local file storage."""
         # Create storage directories
@@ -59,12 +193,25 @@ class StorageService:
         self.reports_path = self.storage_path / "reports"
         self.manifests_path = self.storage_path / "manifests"
         
-        for path in [self.raw_path, self.annotated_path, self.reports_path, self.manifests_path]:
+        self.local_dirs = {
+            "raw": self.raw_path,
+            "annotated": self.annotated_path,
+            "report": self.reports_path,
+            "manifest": self.manifests_path
+        }
+        
+        for path in self.local_dirs.values():
             path.mkdir(parents=True, exist_ok=True)
         
+        # One scan at startup; store/delete keep the counts current afterwards
+        self._dir_file_types = {path: file_type for file_type, path in self.local_dirs.items()}
+        for file_type, path in self.local_dirs.items():
+            with os.scandir(path) as entries:
+                self._file_counts[file_type] = sum(1 for _ in entries)
+        
         logger.debug(f"Local storage directories created at {self.storage_path}")
     
-    def _setup_mongodb_storage(self) -> None:
+    def _setup_mongodb_storage(self) -> Dict[str, Any]:
         """Setup MongoDB GridFS storage."""
         if not PYMONGO_AVAILABLE:
             raise RuntimeError("pymongo not available for MongoDB storage")
@@ -72,43 +219,95 @@ class StorageService:
         if not self.mongodb_uri:
             raise ValueError("MongoDB URI not configured")
         
-        # Initialize MongoDB client
+        # Initialize MongoDB client. The driver is synchronous, so maxPoolSize should
+        # roughly match the number of threads doing storage I/O; idle connections
+        # are pruned after a minute, and wire compression mainly helps JSON manifests
+        # (image bytes are already compressed). Unavailable compressors are skipped.
         try:
-            self.mongo_client = MongoClient(self.mongodb_uri)
+            self.mongo_client = MongoClient(
+                self.mongodb_uri,
+                maxPoolSize=self.mongo_max_pool_size,
+                minPoolSize=self.mongo_min_pool_size,
+                maxIdleTimeMS=60_000,
+                waitQueueTimeoutMS=5_000,
+                serverSelectionTimeoutMS=3_000,
+                compressors="zstd,snappy,zlib",
+                retryWrites=True
+            )
             self.database = self.mongo_client[self.mongodb_database]
             
             # Test connection
             self.mongo_client.admin.command('ping')
             
             # Initialize GridFS collections for different file types
-            collection_names = ['raw', 'annotated', 'reports', 'manifests']
-            for collection_name in collection_names:
-                self.gridfs_collections[collection_name] = GridFS(
+            gridfs_collections = {}
+            for file_type, collection_name in _GRIDFS_COLLECTIONS.items():
+                gridfs_collections[file_type] = GridFS(
                     self.database, 
                     collection=collection_name
                 )
+                # file_id is the lookup key for every retrieve/delete/URL request
+                try:
+                    self.database[f"{collection_name}.files"].create_index("file_id")
+                except Exception as e:
+                    logger.warning(f"Could not create file_id index on {collection_name}: {e}")
             
-            logger.debug(f"MongoDB GridFS collections initialized: {collection_names}")
+            logger.debug(f"MongoDB GridFS collections initialized: {list(_GRIDFS_COLLECTIONS.values())}")
+            return gridfs_collections
             
         except Exception as e:
             logger.error(f"Cannot connect to MongoDB: {e}")
             raise
     
-    def store_file(self, file_data: bytes, file_type: str, file_extension: str = "jpg") -> str:
+    def store_file(self, file_data: Union[bytes, BinaryIO], file_type: str, file_extension: str = "jpg") -> str:
         """
         Store file and return file ID.
         
         Args:
-            file_data: Binary file data
+            file_data: Binary file data, or a binary stream that is read in chunks
             file_type: Type of file (raw, annotated, report, manifest)
             file_extension: File extension without dot
             
         Returns:
             File ID for retrieval
         """
+        return self.store_files([(file_data, file_type, file_extension)])[0]
+    
+    def store_files(self, items: List[Tuple[Union[bytes, BinaryIO], str, str]]) -> List[str]:
+        """
+        Store several files in one call, writing them concurrently.
+        
+        Args:
+            items: (file_data, file_type, file_extension) tuples
+            
+        Returns:
+            File IDs in the same order as items
+            
+        Raises:
+            The first write error; files already stored by the call are deleted first
+        """
+        if len(items) <= 1:
+            return [self._store_single(*item) for item in items]
+        
+        # File writes, socket I/O and SHA-256 all release the GIL, so threads overlap them
+        futures = [_store_executor.submit(self._store_single, *item) for item in items]
+        wait(futures)
+        
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            # Don't leave the rest of a partially stored batch behind as orphans
+            for future in futures:
+                if future.exception() is None:
+                    self.delete_file(future.result())
+            raise errors[0]
+        
+        return [future.result() for future in futures]
+    
+    def _store_single(self, file_data: Union[bytes, BinaryIO], file_type: str, file_extension: str) -> str:
+        """Store one file and return its file ID."""
         try:
             # Generate unique file ID
-            file_id = f"file-{file_type}-{uuid4().hex[:12]}-{int(datetime.utcnow().timestamp())}"
+            file_id = f"file-{file_type}-{uuid4().hex[:12]}-{time.time_ns() // 1_000_000_000}"
             filename = f"{file_id}.{file_extension}"
             
             if self.storage_type == "local":
@@ -122,53 +321,70 @@ class StorageService:
             logger.error(f"Failed to store {file_type} file: {e}")
             raise
     
-    def _store_local_file(self, file_data: bytes, file_type: str, filename: str, file_id: str) -> str:
+    def _store_local_file(self, file_data: Union[bytes, BinaryIO], file_type: str, filename: str, file_id: str) -> str:
         """Store file locally."""
         # Determine storage path based on file type
-        if file_type == "raw":
-            storage_dir = self.raw_path
-        elif file_type == "annotated":
-            storage_dir = self.annotated_path
-        elif file_type == "report":
-            storage_dir = self.reports_path
-        elif file_type == "manifest":
-            storage_dir = self.manifests_path
-        else:
+        storage_dir = self.local_dirs.get(file_type)
+        if storage_dir is None:
             raise ValueError(f"Unknown file type: {file_type}")
         
         file_path = storage_dir / filename
         
-        # Write file
+        # Write file, hashing for integrity as the data goes out
         with open(file_path, 'wb') as f:
-            f.write(file_data)
+            if isinstance(file_data, (bytes, bytearray, memoryview)):
+                f.write(file_data)
+                file_hash = hashlib.sha256(file_data).hexdigest()
+            elif hasattr(file_data, "readinto"):
+                # Same reusable-buffer loop hashlib.file_digest uses: no per-chunk allocation
+                sha256 = hashlib.sha256()
+                buffer = bytearray(_STREAM_CHUNK_SIZE)
+                view = memoryview(buffer)
+                while size := file_data.readinto(buffer):
+                    sha256.update(view[:size])
+                    f.write(view[:size])
+                file_hash = sha256.hexdigest()
+            else:
+                reader = _HashingReader(file_data)
+                while chunk := reader.read(_STREAM_CHUNK_SIZE):
+                    f.write(chunk)
+                file_hash = reader.sha256.hexdigest()
         
-        # Calculate file hash for integrity
-        file_hash = hashlib.sha256(file_data).hexdigest()
+        with self._count_lock:
+            self._file_counts[file_type] += 1
         
         logger.debug(f"Stored {file_type} file: {filename} (hash: {file_hash[:8]})")
         return file_id
     
-    def _store_mongodb_file(self, file_data: bytes, file_type: str, filename: str, file_id: str) -> str:
+    def _store_mongodb_file(self, file_data: Union[bytes, BinaryIO], file_type: str, filename: str, file_id: str) -> str:
         """Store file in MongoDB GridFS."""
         if file_type not in self.gridfs_collections:
             raise ValueError(f"Unknown file type: {file_type}")
         
         gridfs = self.gridfs_collections[file_type]
         
-        # Calculate file hash for integrity
-        file_hash = hashlib.sha256(file_data).hexdigest()
-        
-        # Store file with metadata
-        file_stream = io.BytesIO(file_data)
-        gridfs_id = gridfs.put(
-            file_stream,
+        # Store file with metadata; GridFS reads the source chunk by chunk while
+        # the hash is computed on the same pass
+        reader = _HashingReader(
+            _BufferReader(file_data) if isinstance(file_data, (bytes, bytearray, memoryview)) else file_data
+        )
+        grid_in = gridfs.new_file(
+            chunkSize=_GRIDFS_CHUNK_SIZE,
             filename=filename,
             file_id=file_id,
             content_type=self._get_content_type(filename),
-            upload_date=datetime.utcnow(),
-            sha256=file_hash,
-            size=len(file_data)
+            upload_date=datetime.utcnow()
         )
+        try:
+            grid_in.write(reader)
+            file_hash = reader.sha256.hexdigest()
+            # Attributes set before close are written to the files document
+            grid_in.sha256 = file_hash
+            grid_in.size = reader.size
+        except Exception:
+            grid_in.abort()
+            raise
+        grid_in.close()
         
         logger.debug(f"Stored {file_type} file to MongoDB GridFS: {filename} (hash: {file_hash[:8]})")
         return file_id
@@ -195,25 +411,49 @@ class StorageService:
             logger.error(f"Failed to retrieve file {file_id}: {e}")
             return None
     
+    def _find_local_files(self, file_id: str) -> List[Path]:
+        """Locate the stored file(s) for a file ID."""
+        file_type = _parse_file_type(file_id)
+        if file_type:
+            # The file type in the ID names the directory; probe known extensions directly
+            storage_dir = self.local_dirs[file_type]
+            for extension in _LOCAL_EXTENSIONS:
+                file_path = storage_dir / f"{file_id}.{extension}"
+                if file_path.is_file():
+                    return [file_path]
+            return list(storage_dir.glob(f"{file_id}.*"))
+        
+        # Unrecognized ID format: search in all storage directories
+        return [
+            file_path
+            for storage_dir in self.local_dirs.values()
+            for file_path in storage_dir.glob(f"{file_id}.*")
+        ]
+    
     def _retrieve_local_file(self, file_id: str) -> Optional[bytes]:
         """Retrieve file from local storage."""
-        # Search in all storage directories
-        for storage_dir in [self.raw_path, self.annotated_path, self.reports_path, self.manifests_path]:
-            for file_path in storage_dir.glob(f"{file_id}.*"):
-                try:
-                    with open(file_path, 'rb') as f:
-                        return f.read()
-                except Exception as e:
-                    logger.warning(f"Failed to read {file_path}: {e}")
-                    continue
+        for file_path in self._find_local_files(file_id):
+            try:
+                with open(file_path, 'rb') as f:
+                    return f.read()
+            except Exception as e:
+                logger.warning(f"Failed to read {file_path}: {e}")
+                continue
         
         logger.warning(f"File not found in local storage: {file_id}")
         return None
     
+    def _gridfs_candidates(self, file_id: str) -> List[Tuple[str, Any]]:
+        """GridFS collections that may hold a file ID, narrowed by its encoded type."""
+        file_type = _parse_file_type(file_id)
+        if file_type in self.gridfs_collections:
+            return [(file_type, self.gridfs_collections[file_type])]
+        # Unrecognized ID format: search in all collections
+        return list(self.gridfs_collections.items())
+    
     def _retrieve_mongodb_file(self, file_id: str) -> Optional[bytes]:
         """Retrieve file from MongoDB GridFS."""
-        # Search in all collections
-        for file_type, gridfs in self.gridfs_collections.items():
+        for file_type, gridfs in self._gridfs_candidates(file_id):
             try:
                 # Find file by file_id
                 grid_out = gridfs.find_one({"file_id": file_id})
@@ -228,6 +468,42 @@ class StorageService:
         logger.warning(f"File not found in MongoDB GridFS: {file_id}")
         return None
     
+    def stream_file(self, file_id: str, writer: BinaryIO) -> bool:
+        """
+        Copy a stored file into a writer chunk by chunk, without loading it whole.
+        
+        Args:
+            file_id: File ID returned by store_file
+            writer: Binary file-like object to receive the data
+            
+        Returns:
+            True if the file was found and written
+        """
+        try:
+            if self.storage_type == "local":
+                for file_path in self._find_local_files(file_id):
+                    with open(file_path, 'rb') as f:
+                        shutil.copyfileobj(f, writer, _STREAM_CHUNK_SIZE)
+                    return True
+                logger.warning(f"File not found in local storage: {file_id}")
+                return False
+            elif self.storage_type == "mongodb":
+                for file_type, gridfs in self._gridfs_candidates(file_id):
+                    grid_out = gridfs.find_one({"file_id": file_id})
+                    if grid_out:
+                        # One GridFS chunk at a time; never joined into a single buffer
+                        while chunk := grid_out.readchunk():
+                            writer.write(chunk)
+                        return True
+                logger.warning(f"File not found in MongoDB GridFS: {file_id}")
+                return False
+            else:
+                raise ValueError(f"Unsupported storage type: {self.storage_type}")
+                
+        except Exception as e:
+            logger.error(f"Failed to stream file {file_id}: {e}")
+            return False
+    
     def get_file_url(self, file_id: str, expires_in: int = 3600) -> Optional[str]:
         """
         Get signed URL for file access.
@@ -249,24 +525,16 @@ class StorageService:
         """Generate signed URL for MongoDB GridFS file."""
         try:
             # Find the file first
-            for file_type, gridfs in self.gridfs_collections.items():
+            for file_type, gridfs in self._gridfs_candidates(file_id):
                 try:
                     grid_out = gridfs.find_one({"file_id": file_id})
                     if grid_out:
-                        # Create a signed URL token (simplified implementation)
-                        # In production, this should use proper JWT or similar
-                        import base64
-                        import json
-                        
-                        expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
                         token_data = {
                             "file_id": file_id,
                             "file_type": file_type,
-                            "expires_at": expires_at.isoformat()
+                            "expires_at": int(time.time()) + expires_in
                         }
-                        
-                        # Simple base64 encoding (in production, use proper signing)
-                        token = base64.b64encode(json.dumps(token_data).encode()).decode()
+                        token = self._sign_url_token(token_data)
                         
                         # Return URL with token (this would be handled by your web server)
                         return f"/api/files/{file_id}?token={token}"
@@ -283,6 +551,27 @@ class StorageService:
             logger.error(f"Failed to generate signed URL for {file_id}: {e}")
             return None
     
+    def _sign_url_token(self, token_data: Dict[str, Any]) -> str:
+        """Encode token data as `<payload>.<mac>`, both URL-safe base64."""
+        payload = json.dumps(token_data, separators=(',', ':')).encode()
+        mac = self._url_mac_template.copy()
+        mac.update(payload)
+        return f"{_b64url(payload)}.{_b64url(mac.digest())}"
+    
+    def verify_file_token(self, token: str, file_id: str) -> bool:
+        """Check a signed URL token's MAC, file ID and expiry."""
+        try:
+            payload_part, _, mac_part = token.partition(".")
+            payload = _b64url_decode(payload_part)
+            mac = self._url_mac_template.copy()
+            mac.update(payload)
+            if not hmac.compare_digest(mac.digest(), _b64url_decode(mac_part)):
+                return False
+            token_data = json.loads(payload)
+        except (ValueError, TypeError):
+            return False
+        return token_data.get("file_id") == file_id and token_data.get("expires_at", 0) > time.time()
+    
     def delete_file(self, file_id: str) -> bool:
         """
         Delete file by ID.
@@ -308,21 +597,22 @@ class StorageService:
     def _delete_local_file(self, file_id: str) -> bool:
         """Delete file from local storage."""
         deleted = False
-        for storage_dir in [self.raw_path, self.annotated_path, self.reports_path, self.manifests_path]:
-            for file_path in storage_dir.glob(f"{file_id}.*"):
-                try:
-                    file_path.unlink()
-                    deleted = True
-                    logger.debug(f"Deleted local file: {file_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to delete {file_path}: {e}")
+        for file_path in self._find_local_files(file_id):
+            try:
+                file_path.unlink()
+                deleted = True
+                with self._count_lock:
+                    self._file_counts[self._dir_file_types[file_path.parent]] -= 1
+                logger.debug(f"Deleted local file: {file_path}")
+            except Exception as e:
+                logger.warning(f"Failed to delete {file_path}: {e}")
         
         return deleted
     
     def _delete_mongodb_file(self, file_id: str) -> bool:
         """Delete file from MongoDB GridFS."""
         deleted = False
-        for file_type, gridfs in self.gridfs_collections.items():
+        for file_type, gridfs in self._gridfs_candidates(file_id):
             try:
                 # Find and delete all files with this file_id
                 for grid_out in gridfs.find({"file_id": file_id}):
@@ -335,18 +625,10 @@ class StorageService:
         
         return deleted
     
-    def _get_content_type(self, filename: str) -> str:
+    @staticmethod
+    def _get_content_type(filename: str) -> str:
         """Get content type based on file extension."""
-        extension = Path(filename).suffix.lower()
-        content_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.pdf': 'application/pdf',
-            '.json': 'application/json',
-            '.txt': 'text/plain'
-        }
-        return content_types.get(extension, 'application/octet-stream')
+        return _CONTENT_TYPES.get(filename.rpartition('.')[2].lower(), 'application/octet-stream')
     
     def get_storage_info(self) -> Dict[str, Any]:
         """Get storage service information."""
@@ -360,33 +642,46 @@ class StorageService:
         
         if self.storage_type == "local":
             # Add local storage stats
-            try:
-                total_files = 0
-                for storage_dir in [self.raw_path, self.annotated_path, self.reports_path, self.manifests_path]:
-                    if storage_dir.exists():
-                        total_files += len(list(storage_dir.glob("*")))
-                info["total_files"] = total_files
-            except Exception:
-                info["total_files"] = "unknown"
+            with self._count_lock:
+                info["total_files"] = sum(self._file_counts.values())
+                info["file_counts"] = dict(self._file_counts)
         
         elif self.storage_type == "mongodb":
             # Add MongoDB storage stats
             try:
-                total_files = 0
-                collection_stats = {}
-                for file_type, gridfs in self.gridfs_collections.items():
-                    count = gridfs._GridFS__files.count_documents({})
-                    collection_stats[file_type] = count
-                    total_files += count
-                
-                info["total_files"] = total_files
+                collection_stats = self._get_mongodb_counts()
+                info["total_files"] = sum(collection_stats.values())
                 info["collection_stats"] = collection_stats
             except Exception:
                 info["total_files"] = "unknown"
                 info["collection_stats"] = "unknown"
         
         return info
+    
+    def _get_mongodb_counts(self) -> Dict[str, int]:
+        """Get per-collection GridFS file counts, cached for a few seconds."""
+        now = time.monotonic()
+        if self._mongo_counts is None or now >= self._mongo_counts_expire:
+            self._mongo_counts = {
+                file_type: self.database[f"{_GRIDFS_COLLECTIONS[file_type]}.files"].count_documents({})
+                for file_type in self.gridfs_collections
+            }
+            self._mongo_counts_expire = now + _COUNT_CACHE_TTL_SECONDS
+        return self._mongo_counts
+
+
+# Global storage service instance, created on first access (PEP 562) so that
+# importing this module does not read config or connect to MongoDB
+_storage_service: Optional[StorageService] = None
+_storage_service_lock = threading.Lock()
 
 
-# Global storage service instance
-storage_service = StorageService()
\ No newline at end of file
+def __getattr__(name: str) -> Any:
+    global _storage_service
+    if name == "storage_service":
+        if _storage_service is None:
+            with _storage_service_lock:
+                if _storage_service is None:
+                    _storage_service = StorageService()
+        return _storage_service
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
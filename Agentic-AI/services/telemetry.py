@@ -1,15 +1,153 @@
 """Audit and telemetry service for monitoring and logging."""
 
+import re
 import time
+import itertools
 import json
-from datetime import datetime
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
 from contextlib import contextmanager
 from uuid import uuid4
 from loguru import logger
 from collections import defaultdict, deque
 import threading
 
+import numpy as np
+
+# Audit metadata keys containing any of these fragments are redacted
+_SENSITIVE_KEYS = (
+    'password', 'token', 'api_key', 'secret', 'auth', 'credential',
+    'ssn', 'social_security', 'credit_card', 'patient_id', 'medical_record'
+)
+_SENSITIVE_KEY_RE = re.compile('|'.join(re.escape(key) for key in _SENSITIVE_KEYS))
+
+# Latency samples kept per metric key
+_LATENCY_WINDOW = 1000
+
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def _format_timestamp_ns(timestamp_ns: int) -> str:
+    """Render an epoch-nanosecond timestamp as a naive UTC ISO-8601 string."""
+    return (_UNIX_EPOCH + timedelta(microseconds=timestamp_ns // 1000)).isoformat()
+
+
+# Prometheus exposition text; headers and line formats are built once
+_PROM_REQUESTS_HEADER = (
+    "# HELP orthopedic_requests_total Total number of requests\n"
+    "# TYPE orthopedic_requests_total counter"
+)
+_PROM_SUCCESS_FMT = 'orthopedic_requests_total{operation="%s",status="success"} %d'
+_PROM_FAILURE_FMT = 'orthopedic_requests_total{operation="%s",status="failure"} %d'
+_PROM_SUCCESS_RATE_HEADER = (
+    "# HELP orthopedic_success_rate Success rate by operation\n"
+    "# TYPE orthopedic_success_rate gauge"
+)
+_PROM_SUCCESS_RATE_FMT = 'orthopedic_success_rate{operation="%s"} %r'
+_PROM_DURATION_HEADER = (
+    "# HELP orthopedic_request_duration_seconds Request duration in seconds\n"
+    "# TYPE orthopedic_request_duration_seconds histogram"
+)
+_PROM_DURATION_COUNT_FMT = 'orthopedic_request_duration_seconds_count{operation="%s"} %d'
+_PROM_DURATION_SUM_FMT = 'orthopedic_request_duration_seconds_sum{operation="%s"} %r'
+_PROM_ACTIVE_REQUESTS_FMT = (
+    "# HELP orthopedic_active_requests Currently active requests\n"
+    "# TYPE orthopedic_active_requests gauge\n"
+    "orthopedic_active_requests %d"
+)
+
+
+# Process-wide sample order, so rings from different threads can be merged by recency
+_sample_sequence = itertools.count()
+
+
+class _LatencyRing:
+    """Fixed-size ring buffer of latency samples backed by a NumPy array.
+    
+    Each sample carries a sequence number from _sample_sequence so merged
+    windows can keep the newest samples across rings.
+    """
+    
+    __slots__ = ("_samples", "_sequence", "_index", "_count")
+    
+    def __init__(self, size: int = _LATENCY_WINDOW):
+        self._samples = np.zeros(size, dtype=np.float64)
+        self._sequence = np.zeros(size, dtype=np.int64)
+        self._index = 0
+        self._count = 0
+    
+    def append(self, value: float, sequence: Optional[int] = None) -> None:
+        self._samples[self._index] = value
+        self._sequence[self._index] = next(_sample_sequence) if sequence is None else sequence
+        self._index = (self._index + 1) % len(self._samples)
+        if self._count < len(self._samples):
+            self._count += 1
+    
+    def extend(self, values: np.ndarray, sequence: np.ndarray) -> None:
+        """Append samples oldest first with their sequence numbers, keeping the newest that fit."""
+        size = len(self._samples)
+        for value, number in zip(values[-size:], sequence[-size:]):
+            self.append(value, int(number))
+    
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Copies of the stored samples and their sequence numbers, oldest first."""
+        if self._count < len(self._samples):
+            return self._samples[:self._count].copy(), self._sequence[:self._count].copy()
+        order = np.r_[self._index:len(self._samples), 0:self._index]
+        return self._samples[order], self._sequence[order]
+    
+    def __len__(self) -> int:
+        return self._count
+
+
+def _newest_samples(parts: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """The _LATENCY_WINDOW most recent samples, and their sequence numbers, across
+    ring snapshots (in no particular order)."""
+    if len(parts) == 1:
+        return parts[0]
+    samples = np.concatenate([part[0] for part in parts])
+    sequence = np.concatenate([part[1] for part in parts])
+    if len(samples) <= _LATENCY_WINDOW:
+        return samples, sequence
+    newest = np.argpartition(sequence, -_LATENCY_WINDOW)[-_LATENCY_WINDOW:]
+    return samples[newest], sequence[newest]
+
+
+def _latency_stats(samples: np.ndarray) -> Dict[str, Any]:
+    """Summary statistics for a non-empty sample array."""
+    n = len(samples)
+    ranks = (n // 2, int(n * 0.95), int(n * 0.99))
+    # Partial selection is O(n) versus a full O(n log n) sort
+    selected = np.partition(samples, ranks)
+    return {
+        "count": n,
+        "min": float(samples.min()),
+        "max": float(samples.max()),
+        "mean": float(samples.mean()),
+        "p50": float(selected[ranks[0]]),
+        "p95": float(selected[ranks[1]]),
+        "p99": float(selected[ranks[2]])
+    }
+
+
+class _MetricsShard:
+    """Counters and latency samples written by a single thread."""
+    
+    __slots__ = ("owner", "step_counters", "success_counters", "failure_counters", "latency_samples")
+    
+    def __init__(self, owner: Optional[threading.Thread] = None):
+        self.owner = owner
+        self.step_counters = defaultdict(int)
+        self.success_counters = defaultdict(int)
+        self.failure_counters = defaultdict(int)
+        self.latency_samples = defaultdict(_LatencyRing)
+    
+    def clear(self) -> None:
+        self.step_counters.clear()
+        self.success_counters.clear()
+        self.failure_counters.clear()
+        self.latency_samples.clear()
+
 
 class TelemetryService:
     """Service for audit logging, metrics collection, and monitoring."""
@@ -19,14 +157,17 @@ class TelemetryService:
         self.metrics = defaultdict(lambda: defaultdict(int))
         self.latency_metrics = defaultdict(list)
         self.audit_logs = deque(maxlen=10000)  # Keep last 10k audit entries
+        # Secondary index of the retained audit entries by request ID
+        self._audit_by_request: Dict[str, deque] = {}
         self.active_requests = {}
         self._lock = threading.Lock()
         
-        # Metrics counters
-        self.step_counters = defaultdict(int)
-        self.success_counters = defaultdict(int)
-        self.failure_counters = defaultdict(int)
-        self.latency_samples = defaultdict(lambda: deque(maxlen=1000))
+        # Metrics counters are sharded per thread so the recording hot path takes
+        # no lock; shards are merged when metrics are read
+        self._shards: List[_MetricsShard] = []
+        self._local = threading.local()
+        # Totals and newest latency samples folded in from threads that have exited
+        self._retired_shard = _MetricsShard()
         
         logger.info("Telemetry service initialized")
     
@@ -97,7 +238,8 @@ class TelemetryService:
         safe_metadata = self._redact_sensitive_data(metadata or {})
         
         audit_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # Epoch nanoseconds; formatted as ISO-8601 when read
+            "timestamp": time.time_ns(),
             "request_id": request_id,
             "event_type": event_type,
             "operation": operation,
@@ -108,7 +250,16 @@ class TelemetryService:
         }
         
         with self._lock:
+            # Keep the request index in step with entries evicted from the bounded deque
+            if len(self.audit_logs) == self.audit_logs.maxlen:
+                evicted_id = self.audit_logs[0]["request_id"]
+                evicted_entries = self._audit_by_request.get(evicted_id)
+                if evicted_entries:
+                    evicted_entries.popleft()
+                    if not evicted_entries:
+                        del self._audit_by_request[evicted_id]
             self.audit_logs.append(audit_entry)
+            self._audit_by_request.setdefault(request_id, deque()).append(audit_entry)
         
         # Also log to structured logger
         logger.info(
@@ -125,17 +276,10 @@ class TelemetryService:
     
     def _redact_sensitive_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Redact sensitive information from log data."""
-        sensitive_keys = {
-            'password', 'token', 'api_key', 'secret', 'auth', 'credential',
-            'ssn', 'social_security', 'credit_card', 'patient_id', 'medical_record'
-        }
-        
         redacted_data = {}
         for key, value in data.items():
-            key_lower = key.lower()
-            
             # Check if key contains sensitive information
-            if any(sensitive in key_lower for sensitive in sensitive_keys):
+            if _SENSITIVE_KEY_RE.search(key.lower()):
                 redacted_data[key] = "[REDACTED]"
             elif isinstance(value, dict):
                 redacted_data[key] = self._redact_sensitive_data(value)
@@ -147,13 +291,87 @@ class TelemetryService:
         
         return redacted_data
     
+    def _shard(self) -> _MetricsShard:
+        """Metrics shard owned by the calling thread."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _MetricsShard(threading.current_thread())
+            with self._lock:
+                self._retire_dead_shards()
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+    
+    def _retire_dead_shards(self) -> None:
+        """Fold shards of exited threads into the retired shard. Caller holds the lock."""
+        live_shards = []
+        retired = self._retired_shard
+        retired_latency = defaultdict(list)
+        for shard in self._shards:
+            if shard.owner.is_alive():
+                live_shards.append(shard)
+                continue
+            # The owner has exited, so nothing writes to this shard any more
+            for step, count in shard.step_counters.items():
+                retired.step_counters[step] += count
+            for operation, count in shard.success_counters.items():
+                retired.success_counters[operation] += count
+            for operation, count in shard.failure_counters.items():
+                retired.failure_counters[operation] += count
+            for key, samples in shard.latency_samples.items():
+                if len(samples):
+                    retired_latency[key].append(samples.snapshot())
+        self._shards = live_shards
+        
+        # Rebuild each retired ring from the newest samples overall, oldest first
+        for key, parts in retired_latency.items():
+            previous = retired.latency_samples.get(key)
+            if previous is not None and len(previous):
+                parts.append(previous.snapshot())
+            samples, sequence = _newest_samples(parts)
+            order = np.argsort(sequence, kind="stable")
+            ring = _LatencyRing()
+            ring.extend(samples[order], sequence[order])
+            retired.latency_samples[key] = ring
+    
+    def _merge_shards(self) -> Tuple[Dict[str, int], Dict[str, int], Dict[str, int], Dict[str, np.ndarray]]:
+        """Merge per-thread counters and latency samples into combined views."""
+        with self._lock:
+            self._retire_dead_shards()
+            shards = list(self._shards)
+            # Only changed under the lock, so copy it here
+            retired = self._retired_shard
+            step_counts = defaultdict(int, retired.step_counters)
+            success_counts = defaultdict(int, retired.success_counters)
+            failure_counts = defaultdict(int, retired.failure_counters)
+            latency_parts = defaultdict(list)
+            for key, samples in retired.latency_samples.items():
+                if len(samples):
+                    latency_parts[key].append(samples.snapshot())
+        
+        for shard in shards:
+            # dict() copies are atomic, so owner threads may keep recording meanwhile
+            for step, count in dict(shard.step_counters).items():
+                step_counts[step] += count
+            for operation, count in dict(shard.success_counters).items():
+                success_counts[operation] += count
+            for operation, count in dict(shard.failure_counters).items():
+                failure_counts[operation] += count
+            for key, samples in dict(shard.latency_samples).items():
+                if len(samples):
+                    latency_parts[key].append(samples.snapshot())
+        
+        # Several shards can hold samples for one key; keep the newest _LATENCY_WINDOW
+        latency_samples = {key: _newest_samples(parts)[0] for key, parts in latency_parts.items()}
+        return dict(step_counts), dict(success_counts), dict(failure_counts), latency_samples
+    
     def record_step_execution(self, request_id: str, step: str, duration: float,
                             versions: Optional[Dict[str, str]] = None,
                             metadata: Optional[Dict[str, Any]] = None) -> None:
         """Record execution of a processing step."""
-        with self._lock:
-            self.step_counters[step] += 1
-            self.latency_samples[f"step_{step}"].append(duration)
+        shard = self._shard()
+        shard.step_counters[step] += 1
+        shard.latency_samples[f"step_{step}"].append(duration)
         
         self.log_audit_event(
             request_id=request_id,
@@ -167,15 +385,15 @@ class TelemetryService:
     
     def record_success(self, operation: str, duration: float) -> None:
         """Record successful operation."""
-        with self._lock:
-            self.success_counters[operation] += 1
-            self.latency_samples[f"operation_{operation}"].append(duration)
+        shard = self._shard()
+        shard.success_counters[operation] += 1
+        shard.latency_samples[f"operation_{operation}"].append(duration)
     
     def record_failure(self, operation: str, duration: float, error: str) -> None:
         """Record failed operation."""
-        with self._lock:
-            self.failure_counters[operation] += 1
-            self.latency_samples[f"operation_{operation}"].append(duration)
+        shard = self._shard()
+        shard.failure_counters[operation] += 1
+        shard.latency_samples[f"operation_{operation}"].append(duration)
         
         logger.error(f"Operation failed: {operation}", extra={
             "operation": operation,
@@ -185,62 +403,50 @@ class TelemetryService:
     
     def get_metrics(self) -> Dict[str, Any]:
         """Get current metrics for monitoring endpoint."""
+        step_counts, success_counts, failure_counts, latency_samples = self._merge_shards()
+        
         with self._lock:
             metrics = {
                 "timestamp": datetime.utcnow().isoformat(),
                 "active_requests": len(self.active_requests),
                 "total_audit_entries": len(self.audit_logs),
-                "step_counts": dict(self.step_counters),
-                "success_counts": dict(self.success_counters),
-                "failure_counts": dict(self.failure_counters),
+                "step_counts": step_counts,
+                "success_counts": success_counts,
+                "failure_counts": failure_counts,
                 "success_rates": {},
                 "latency_stats": {}
             }
-            
-            # Calculate success rates
-            for operation in set(list(self.success_counters.keys()) + list(self.failure_counters.keys())):
-                total = self.success_counters[operation] + self.failure_counters[operation]
-                if total > 0:
-                    metrics["success_rates"][operation] = self.success_counters[operation] / total
-            
-            # Calculate latency statistics
-            for key, samples in self.latency_samples.items():
-                if samples:
-                    sorted_samples = sorted(samples)
-                    n = len(sorted_samples)
-                    metrics["latency_stats"][key] = {
-                        "count": n,
-                        "min": min(sorted_samples),
-                        "max": max(sorted_samples),
-                        "mean": sum(sorted_samples) / n,
-                        "p50": sorted_samples[n // 2],
-                        "p95": sorted_samples[int(n * 0.95)] if n > 0 else 0,
-                        "p99": sorted_samples[int(n * 0.99)] if n > 0 else 0
-                    }
+        
+        # Calculate success rates
+        for operation in success_counts.keys() | failure_counts.keys():
+            total = success_counts.get(operation, 0) + failure_counts.get(operation, 0)
+            if total > 0:
+                metrics["success_rates"][operation] = success_counts.get(operation, 0) / total
+        
+        # Calculate latency statistics
+        for key, samples in latency_samples.items():
+            metrics["latency_stats"][key] = _latency_stats(samples)
         
         return metrics
     
     def get_audit_logs(self, request_id: Optional[str] = None, 
                       operation: Optional[str] = None,
                       limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Get audit logs with optional filtering."""
+        """Get audit logs with optional filtering (newest first)."""
         with self._lock:
-            logs = list(self.audit_logs)
-        
-        # Filter by request_id
-        if request_id:
-            logs = [log for log in logs if log.get("request_id") == request_id]
-        
-        # Filter by operation
-        if operation:
-            logs = [log for log in logs if log.get("operation") == operation]
-        
-        # Sort by timestamp (newest first)
-        logs = sorted(logs, key=lambda x: x.get("timestamp", ""), reverse=True)
+            if request_id:
+                snapshot = list(self._audit_by_request.get(request_id, ()))
+            else:
+                snapshot = list(self.audit_logs)
         
-        # Apply limit
-        if limit:
-            logs = logs[:limit]
+        # Entries are appended in time order, so walking backwards yields newest first
+        logs = []
+        for log in reversed(snapshot):
+            if operation and log.get("operation") != operation:
+                continue
+            logs.append({**log, "timestamp": _format_timestamp_ns(log["timestamp"])})
+            if limit and len(logs) >= limit:
+                break
         
         return logs
     
@@ -265,50 +471,44 @@ class TelemetryService:
             self.metrics.clear()
             self.latency_metrics.clear()
             self.audit_logs.clear()
+            self._audit_by_request.clear()
             self.active_requests.clear()
-            self.step_counters.clear()
-            self.success_counters.clear()
-            self.failure_counters.clear()
-            self.latency_samples.clear()
+            for shard in self._shards:
+                shard.clear()
+            self._retired_shard.clear()
         
         logger.info("Telemetry metrics cleared")
     
     def export_metrics_prometheus(self) -> str:
         """Export metrics in Prometheus format."""
-        metrics = self.get_metrics()
-        lines = []
-        
-        # Add help and type information
-        lines.append("# HELP orthopedic_requests_total Total number of requests")
-        lines.append("# TYPE orthopedic_requests_total counter")
+        # Only counters, sums and counts are exported, so skip the quantile math in get_metrics
+        _, success_counts, failure_counts, latency_samples = self._merge_shards()
+        with self._lock:
+            active_requests = len(self.active_requests)
         
-        # Success counters
-        for operation, count in metrics["success_counts"].items():
-            lines.append(f'orthopedic_requests_total{{operation="{operation}",status="success"}} {count}')
+        lines = [_PROM_REQUESTS_HEADER]
         
-        # Failure counters
-        for operation, count in metrics["failure_counts"].items():
-            lines.append(f'orthopedic_requests_total{{operation="{operation}",status="failure"}} {count}')
+        # Success and failure counters
+        lines.extend(_PROM_SUCCESS_FMT % item for item in success_counts.items())
+        lines.extend(_PROM_FAILURE_FMT % item for item in failure_counts.items())
         
         # Success rates
-        lines.append("# HELP orthopedic_success_rate Success rate by operation")
-        lines.append("# TYPE orthopedic_success_rate gauge")
-        for operation, rate in metrics["success_rates"].items():
-            lines.append(f'orthopedic_success_rate{{operation="{operation}"}} {rate}')
+        lines.append(_PROM_SUCCESS_RATE_HEADER)
+        for operation in success_counts.keys() | failure_counts.keys():
+            successes = success_counts.get(operation, 0)
+            total = successes + failure_counts.get(operation, 0)
+            if total > 0:
+                lines.append(_PROM_SUCCESS_RATE_FMT % (operation, successes / total))
         
         # Latency metrics
-        lines.append("# HELP orthopedic_request_duration_seconds Request duration in seconds")
-        lines.append("# TYPE orthopedic_request_duration_seconds histogram")
-        
-        for key, stats in metrics["latency_stats"].items():
+        lines.append(_PROM_DURATION_HEADER)
+        for key, samples in latency_samples.items():
             operation = key.replace("operation_", "").replace("step_", "")
-            lines.append(f'orthopedic_request_duration_seconds_count{{operation="{operation}"}} {stats["count"]}')
-            lines.append(f'orthopedic_request_duration_seconds_sum{{operation="{operation}"}} {stats["mean"] * stats["count"]}')
+            lines.append(_PROM_DURATION_COUNT_FMT % (operation, len(samples)))
+            lines.append(_PROM_DURATION_SUM_FMT % (operation, float(samples.sum())))
         
         # Active requests
-        lines.append("# HELP orthopedic_active_requests Currently active requests")
-        lines.append("# TYPE orthopedic_active_requests gauge")
-        lines.append(f'orthopedic_active_requests {metrics["active_requests"]}')
+        lines.append(_PROM_ACTIVE_REQUESTS_FMT % active_requests)
         
         return "\n".join(lines)
 
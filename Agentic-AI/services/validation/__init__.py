@@ -1,12 +1,15 @@
 """Validation services for the Orthopedic Assistant MCP Server."""
 
-from .image_validator import ImageValidator
-from .consent_validator import ConsentValidator
+from .image_validator import ImageValidator, ImageValidationResult
+from .consent_validator import ConsentValidator, ConsentValidationResult, get_consent_validator
 from .exceptions import ValidationError, ImageValidationError, ConsentValidationError
 
 __all__ = [
     "ImageValidator",
     "ConsentValidator", 
+    "ImageValidationResult",
+    "ConsentValidationResult",
+    "get_consent_validator",
     "ValidationError",
     "ImageValidationError",
     "ConsentValidationError",
@@ -2,6 +2,9 @@
 
 from typing import Dict, Any, List, Optional
 import logging
+import re
+from dataclasses import dataclass, asdict
+from functools import lru_cache
 from datetime import datetime, timezone
 
 from .exceptions import ConsentValidationError
@@ -9,6 +12,46 @@ from services.error_handler import ErrorCode
 
 logger = logging.getLogger(__name__)
 
+# String consent values (lowercased) that count as granted
+_GRANTED_STRINGS = frozenset({"true", "yes", "granted", "1"})
+
+# Feature-name fragments that trigger the diagnostic and imaging disclaimers
+_DIAGNOSTIC_FEATURE_RE = re.compile(r"diagnostic|triage")
+_IMAGING_FEATURE_RE = re.compile(r"image|vision")
+
+# Request fields dropped before processing so patient identifiers are never stored
+_SENSITIVE_FIELDS = frozenset({
+    "patient_id", "patient_name", "ssn", "medical_record_number",
+    "date_of_birth", "phone_number", "email", "address",
+    "insurance_id", "emergency_contact"
+})
+
+# Privacy notice attached to every response; each response gets its own copy
+_PRIVACY_NOTICE = {
+    "data_retention": "No patient data is stored by this system",
+    "processing_mode": "Ephemeral processing only",
+    "compliance": "Designed for healthcare data privacy standards"
+}
+
+
+def _utc_now_iso() -> str:
+    """Current UTC time as an ISO-8601 string."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass(slots=True, frozen=True)
+class ConsentValidationResult:
+    """Outcome of consent validation for a set of requested features."""
+    valid: bool
+    missing_consents: List[str]
+    applicable_disclaimers: List[Dict[str, str]]
+    privacy_safeguards_applied: bool
+    validated_at: str
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict form for JSON responses."""
+        return asdict(self)
+
 
 class ConsentValidator:
     """Validates user consents and enforces privacy safeguards."""
@@ -20,6 +63,13 @@ class ConsentValidator:
         "image_analysis": [],   # No special consents required for image analysis
     }
     
+    # (consent name, "feature.consent" label) pairs for features that need any consent
+    _REQUIRED_CONSENT_LABELS = {
+        feature: tuple((consent_name, f"{feature}.{consent_name}") for consent_name in consent_names)
+        for feature, consent_names in REQUIRED_CONSENTS.items()
+        if consent_names
+    }
+    
     # Medical disclaimers for different contexts
     MEDICAL_DISCLAIMERS = {
         "general": (
@@ -53,7 +103,7 @@ class ConsentValidator:
     
     def validate_consents(self, 
                          consents: Dict[str, Any], 
-                         required_features: List[str]) -> Dict[str, Any]:
+                         required_features: List[str]) -> ConsentValidationResult:
         """Validate that required consents are provided for requested features.
         
         Args:
@@ -61,46 +111,35 @@ class ConsentValidator:
             required_features: List of features that require consent validation
             
         Returns:
-            Dictionary with validation results and applicable disclaimers
+            ConsentValidationResult with validation results and applicable disclaimers
             
         Raises:
             ConsentValidationError: If required consents are missing
         """
         try:
-            validation_result = {
-                "valid": True,
-                "missing_consents": [],
-                "applicable_disclaimers": [],
-                "privacy_safeguards_applied": True,
-                "validated_at": datetime.now(timezone.utc).isoformat()
-            }
+            validated_at = _utc_now_iso()
             
             # Check each required feature
+            missing_consents = []
             for feature in required_features:
-                missing = self._check_feature_consents(consents, feature)
-                if missing:
-                    validation_result["missing_consents"].extend(missing)
-                    validation_result["valid"] = False
-            
-            # Add applicable medical disclaimers
-            validation_result["applicable_disclaimers"] = self._get_applicable_disclaimers(
-                required_features
-            )
+                missing_consents.extend(self._check_feature_consents(consents, feature))
             
             # If validation failed and in strict mode, raise error
-            if not validation_result["valid"] and self.strict_mode:
-                missing_list = ", ".join(validation_result["missing_consents"])
-                raise ConsentValidationError(
-                    f"Missing required consents: {missing_list}",
-                    ErrorCode.MISSING_CONSENTS
-                )
+            if missing_consents and self.strict_mode:
+                raise ConsentValidationError.missing_consents(missing_consents)
             
-            return validation_result
+            return ConsentValidationResult(
+                valid=not missing_consents,
+                missing_consents=missing_consents,
+                applicable_disclaimers=self._get_applicable_disclaimers(required_features),
+                privacy_safeguards_applied=True,
+                validated_at=validated_at
+            )
             
         except ConsentValidationError:
             raise
         except Exception as e:
-            logger.error(f"Unexpected error validating consents: {e}")
+            logger.error("Unexpected error validating consents: %s", e)
             raise ConsentValidationError(
                 f"Failed to validate consents: {str(e)}",
                 "CONSENT_VALIDATION_ERROR"
@@ -112,99 +151,75 @@ class ConsentValidator:
         Returns:
             List of missing consent names
         """
-        required_consents = self.REQUIRED_CONSENTS.get(feature, [])
-        missing_consents = []
-        
-        for consent_name in required_consents:
-            consent_value = consents.get(consent_name)
-            
-            # Check if consent is explicitly granted
-            if not self._is_consent_granted(consent_value):
-                missing_consents.append(f"{feature}.{consent_name}")
+        required_consents = self._REQUIRED_CONSENT_LABELS.get(feature)
+        if not required_consents:
+            return []
         
-        return missing_consents
+        # Missing unless explicitly granted
+        return [
+            label for consent_name, label in required_consents
+            if not self._is_consent_granted(consents.get(consent_name))
+        ]
     
     def _is_consent_granted(self, consent_value: Any) -> bool:
         """Check if a consent value represents granted consent."""
-        if consent_value is None:
-            return False
-        
-        # Handle boolean values
-        if isinstance(consent_value, bool):
-            return consent_value
-        
-        # Handle string values
         if isinstance(consent_value, str):
-            return consent_value.lower() in ("true", "yes", "granted", "1")
-        
-        # Handle numeric values
-        if isinstance(consent_value, (int, float)):
-            return bool(consent_value)
+            return consent_value.lower() in _GRANTED_STRINGS
         
-        return False
+        # Booleans and numbers; None and anything else is not consent
+        return isinstance(consent_value, (int, float)) and bool(consent_value)
     
     def _get_applicable_disclaimers(self, features: List[str]) -> List[Dict[str, str]]:
         """Get applicable medical disclaimers for requested features."""
-        disclaimers = []
+        # Newline-joined so no fragment can match across two feature names
+        feature_text = "\n".join(features)
         
-        # Always include general disclaimer
-        disclaimers.append({
-            "type": "general",
-            "text": self.MEDICAL_DISCLAIMERS["general"]
-        })
+        # General first and emergency last are always included
+        disclaimer_types = ["general"]
+        if _DIAGNOSTIC_FEATURE_RE.search(feature_text):
+            disclaimer_types.append("diagnostic")
+        if _IMAGING_FEATURE_RE.search(feature_text):
+            disclaimer_types.append("imaging")
+        disclaimer_types.append("emergency")
         
-        # Add feature-specific disclaimers
-        if any("diagnostic" in feature or "triage" in feature for feature in features):
-            disclaimers.append({
-                "type": "diagnostic", 
-                "text": self.MEDICAL_DISCLAIMERS["diagnostic"]
-            })
-        
-        if any("image" in feature or "vision" in feature for feature in features):
-            disclaimers.append({
-                "type": "imaging",
-                "text": self.MEDICAL_DISCLAIMERS["imaging"]
-            })
-        
-        # Always include emergency disclaimer for medical contexts
-        disclaimers.append({
-            "type": "emergency",
-            "text": self.MEDICAL_DISCLAIMERS["emergency"]
-        })
-        
-        return disclaimers
+        # Fresh dicts per call, since callers may modify the response they get
+        texts = self.MEDICAL_DISCLAIMERS
+        return [
+            {"type": disclaimer_type, "text": texts[disclaimer_type]}
+            for disclaimer_type in disclaimer_types
+        ]
     
-    def enforce_privacy_safeguards(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+    def enforce_privacy_safeguards(self, 
+                                   request_data: Dict[str, Any],
+                                   timestamp: Optional[str] = None) -> Dict[str, Any]:
         """Apply privacy safeguards to prevent patient data storage.
         
         Args:
             request_data: Request data that may contain sensitive information
+            timestamp: ISO timestamp to record, e.g. the request's `validated_at`;
+                defaults to the current time
             
         Returns:
             Sanitized request data with privacy safeguards applied
         """
+        applied_at = timestamp or _utc_now_iso()
         try:
-            # Create a copy to avoid modifying original data
-            sanitized_data = request_data.copy()
-            
-            # Remove or redact potentially sensitive fields
-            sensitive_fields = [
-                "patient_id", "patient_name", "ssn", "medical_record_number",
-                "date_of_birth", "phone_number", "email", "address",
-                "insurance_id", "emergency_contact"
-            ]
+            # Copy non-sensitive fields in one pass, leaving the original untouched
+            sanitized_data = {}
+            removed_fields = []
+            for field, value in request_data.items():
+                if field in _SENSITIVE_FIELDS:
+                    removed_fields.append(field)
+                else:
+                    sanitized_data[field] = value
             
-            for field in sensitive_fields:
-                if field in sanitized_data:
-                    logger.warning(f"Removing sensitive field '{field}' from request data")
-                    del sanitized_data[field]
+            if removed_fields:
+                logger.warning("Removing sensitive fields from request data: %s", removed_fields)
             
             # Add privacy metadata
             sanitized_data["_privacy_safeguards"] = {
-                "applied_at": datetime.now(timezone.utc).isoformat(),
-                "sensitive_fields_removed": [
-                    field for field in sensitive_fields if field in request_data
-                ],
+                "applied_at": applied_at,
+                "sensitive_fields_removed": removed_fields,
                 "data_retention_policy": "no_storage",
                 "processing_mode": "ephemeral"
             }
@@ -212,11 +227,11 @@ class ConsentValidator:
             return sanitized_data
             
         except Exception as e:
-            logger.error(f"Error applying privacy safeguards: {e}")
+            logger.error("Error applying privacy safeguards: %s", e)
             # In case of error, return empty dict to prevent data leakage
             return {
                 "_privacy_safeguards": {
-                    "applied_at": datetime.now(timezone.utc).isoformat(),
+                    "applied_at": applied_at,
                     "error": "Privacy safeguard application failed",
                     "data_retention_policy": "no_storage",
                     "processing_mode": "ephemeral"
@@ -258,16 +273,23 @@ class ConsentValidator:
         Returns:
             Response data with medical disclaimers added
         """
-        enhanced_response = response_data.copy()
-        
-        # Add disclaimers
-        enhanced_response["medical_disclaimers"] = self._get_applicable_disclaimers(features_used)
-        
-        # Add privacy notice
-        enhanced_response["privacy_notice"] = {
-            "data_retention": "No patient data is stored by this system",
-            "processing_mode": "Ephemeral processing only",
-            "compliance": "Designed for healthcare data privacy standards"
+        return {
+            **response_data,
+            "medical_disclaimers": self._get_applicable_disclaimers(features_used),
+            "privacy_notice": dict(_PRIVACY_NOTICE)
         }
-        
-        return enhanced_response
\ No newline at end of file
+
+
+def get_consent_validator(strict_mode: bool = True) -> ConsentValidator:
+    """Shared ConsentValidator per strict_mode.
+    
+    Validators hold no per-request state, so one instance is safe to reuse
+    across requests and threads.
+    """
+    # Normalized here so get_consent_validator() and (True) share one cache entry
+    return _cached_consent_validator(bool(strict_mode))
+
+
+@lru_cache(maxsize=2)
+def _cached_consent_validator(strict_mode: bool) -> ConsentValidator:
+    return ConsentValidator(strict_mode)
\ No newline at end of file
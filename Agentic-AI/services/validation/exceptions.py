@@ -1,5 +1,7 @@
 """Validation exceptions for the Orthopedic Assistant MCP Server."""
 
+from typing import List, Optional
+
 from services.error_handler import ValidationError as BaseValidationError, ErrorCode
 
 
@@ -15,10 +17,35 @@ class ImageValidationError(ValidationError):
     
     def __init__(self, message: str, error_code: ErrorCode = ErrorCode.IMAGE_VALIDATION_ERROR):
         super().__init__(message, error_code)
+    
+    @classmethod
+    def too_small(cls, file_size: int, min_size: int) -> "ImageValidationError":
+        """Error for a file below the minimum size."""
+        return cls(
+            f"Image file too small ({file_size} bytes). Minimum size is {min_size} bytes.",
+            ErrorCode.IMAGE_TOO_SMALL
+        )
+    
+    @classmethod
+    def unsupported_format(cls, supported_list: str, image_format: Optional[str] = None) -> "ImageValidationError":
+        """Error for a format outside the supported list (unknown when sniffed from the header)."""
+        detected = f" '{image_format}'" if image_format else ""
+        return cls(
+            f"Unsupported image format{detected}. Supported formats: {supported_list}",
+            ErrorCode.UNSUPPORTED_FORMAT
+        )
 
 
 class ConsentValidationError(ValidationError):
     """Consent validation specific error."""
     
     def __init__(self, message: str, error_code: ErrorCode = ErrorCode.CONSENT_VALIDATION_ERROR):
-        super().__init__(message, error_code)
\ No newline at end of file
+        super().__init__(message, error_code)
+    
+    @classmethod
+    def missing_consents(cls, missing: List[str]) -> "ConsentValidationError":
+        """Error listing the consents that were not granted."""
+        return cls(
+            f"Missing required consents: {', '.join(missing)}",
+            ErrorCode.MISSING_CONSENTS
+        )
\ No newline at end of file
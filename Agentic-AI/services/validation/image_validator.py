@@ -1,8 +1,10 @@
 """Image validation utilities for medical image processing."""
 
 import io
-from typing import Tuple, Optional, Dict, Any
-from PIL import Image, ImageStat
+from dataclasses import dataclass, asdict
+from typing import Tuple, Optional, Dict, Any, Union
+import numpy as np
+from PIL import Image
 import logging
 
 from .exceptions import ImageValidationError
@@ -10,6 +12,50 @@ from services.error_handler import ErrorCode
 
 logger = logging.getLogger(__name__)
 
+# Uploads may arrive as any bytes-like buffer (e.g. a bytearray request body)
+ImageData = Union[bytes, bytearray, memoryview]
+
+# Leading bytes of each supported format, checked before handing data to Pillow
+_FORMAT_SIGNATURES = {
+    "JPEG": b"\xff\xd8\xff",
+    "PNG": b"\x89PNG\r\n\x1a\n",
+}
+
+# Large JPEGs are first checked at a reduced DCT scale no smaller than this
+_ANALYSIS_DRAFT_SIZE = (1024, 1024)
+
+# Pixel levels and their squares, for moments computed from 256-bin band histograms
+_LEVELS = np.arange(256, dtype=np.float64)
+_LEVELS_SQUARED = _LEVELS * _LEVELS
+
+
+def _band_variances(image: Image.Image) -> np.ndarray:
+    """Per-band pixel variance of an 8-bit image, from its histogram."""
+    histogram = np.asarray(image.histogram(), dtype=np.float64).reshape(-1, 256)
+    counts = histogram.sum(axis=1)
+    mean = histogram @ _LEVELS / counts
+    return histogram @ _LEVELS_SQUARED / counts - mean * mean
+
+
+def _byte_length(image_data: ImageData) -> int:
+    """Size in bytes; len() of a memoryview counts items, not bytes."""
+    return image_data.nbytes if isinstance(image_data, memoryview) else len(image_data)
+
+
+@dataclass(slots=True, frozen=True)
+class ImageValidationResult:
+    """Properties of an image that passed validation."""
+    valid: bool
+    format: str
+    size: Tuple[int, int]
+    mode: str
+    file_size_bytes: int
+    normalized_info: Dict[str, Any]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict form for JSON responses."""
+        return asdict(self)
+
 
 class ImageValidator:
     """Validates medical images for quality and format requirements."""
@@ -19,6 +65,7 @@ class ImageValidator:
     MIN_RESOLUTION = (512, 512)  # Minimum width x height
     MAX_FILE_SIZE_MB = 50  # Maximum file size in MB
     MIN_FILE_SIZE_BYTES = 1024  # Minimum 1KB to avoid empty files
+    NORMALIZE_JPEG_QUALITY = 90  # JPEG quality for normalized images
     
     # Feature flags
     DICOM_ENABLED = False  # DICOM support behind feature flag
@@ -26,75 +73,97 @@ class ImageValidator:
     def __init__(self, 
                  min_resolution: Optional[Tuple[int, int]] = None,
                  max_file_size_mb: Optional[int] = None,
-                 dicom_enabled: bool = False):
+                 dicom_enabled: bool = False,
+                 jpeg_quality: Optional[int] = None):
         """Initialize image validator with optional custom settings.
         
         Args:
             min_resolution: Minimum (width, height) resolution
             max_file_size_mb: Maximum file size in MB
             dicom_enabled: Enable DICOM format support
+            jpeg_quality: JPEG quality used by normalize_image
         """
         self.min_resolution = min_resolution or self.MIN_RESOLUTION
         self.max_file_size_mb = max_file_size_mb or self.MAX_FILE_SIZE_MB
+        self.jpeg_quality = jpeg_quality or self.NORMALIZE_JPEG_QUALITY
         self.dicom_enabled = dicom_enabled
         
         # Update supported formats if DICOM is enabled
         self.supported_formats = self.SUPPORTED_FORMATS.copy()
         if self.dicom_enabled:
             self.supported_formats.add("DICOM")
+        
+        # Pillow plugins to try when opening; restricting them skips format probing.
+        # Pillow has no DICOM plugin, so that format never reaches Image.open.
+        self._pil_formats = tuple(sorted(self.supported_formats - {"DICOM"}))
+        self._supported_list = ", ".join(sorted(self.supported_formats))
+        self._signatures = tuple(
+            (image_format, signature) for image_format, signature in _FORMAT_SIGNATURES.items()
+            if image_format in self.supported_formats
+        )
+        # Unrecognised headers can be rejected outright only when every format has a signature
+        self._reject_unknown_headers = not self.dicom_enabled and all(
+            image_format in _FORMAT_SIGNATURES for image_format in self._pil_formats
+        )
     
-    def validate_image(self, image_data: bytes, filename: Optional[str] = None) -> Dict[str, Any]:
+    def validate_image(self, image_data: ImageData, filename: Optional[str] = None) -> ImageValidationResult:
         """Validate image data for medical processing requirements.
         
         Args:
-            image_data: Raw image bytes
+            image_data: Raw image bytes (bytes, bytearray or memoryview)
             filename: Optional filename for better error messages
             
         Returns:
-            Dict containing validation results and normalized image info
+            ImageValidationResult with image properties and normalized image info
             
         Raises:
             ImageValidationError: If validation fails
         """
         try:
             # Basic file size validation
-            self._validate_file_size(image_data, filename)
+            file_size = self._validate_file_size(image_data, filename)
+            
+            # BytesIO shares a bytes buffer but copies anything else, so convert
+            # once here and let both opens below reuse the same bytes
+            if not isinstance(image_data, bytes):
+                image_data = bytes(image_data)
             
-            # Load and validate image format
+            # Load and validate image format; the one opened image serves every check below
             image = self._load_and_validate_format(image_data, filename)
             
+            # Read header properties once
+            image_format, size, mode = image.format, image.size, image.mode
+            
             # Validate image properties
             self._validate_resolution(image, filename)
-            self._validate_image_content(image, filename)
+            normalized_info = self._get_normalized_info(image)
+            self._validate_image_content(image, filename, image_data)
             
             # Return validation results with normalized info
-            return {
-                "valid": True,
-                "format": image.format,
-                "size": image.size,
-                "mode": image.mode,
-                "file_size_bytes": len(image_data),
-                "normalized_info": self._get_normalized_info(image)
-            }
+            return ImageValidationResult(
+                valid=True,
+                format=image_format,
+                size=size,
+                mode=mode,
+                file_size_bytes=file_size,
+                normalized_info=normalized_info
+            )
             
         except ImageValidationError:
             raise
         except Exception as e:
-            logger.error(f"Unexpected error validating image {filename}: {e}")
+            logger.error("Unexpected error validating image %s: %s", filename, e)
             raise ImageValidationError(
                 f"Failed to validate image: {str(e)}",
                 "IMAGE_PROCESSING_ERROR"
             )
     
-    def _validate_file_size(self, image_data: bytes, filename: Optional[str] = None) -> None:
-        """Validate file size constraints."""
-        file_size = len(image_data)
+    def _validate_file_size(self, image_data: ImageData, filename: Optional[str] = None) -> int:
+        """Validate file size constraints and return the size in bytes."""
+        file_size = _byte_length(image_data)
         
         if file_size < self.MIN_FILE_SIZE_BYTES:
-            raise ImageValidationError(
-                f"Image file too small ({file_size} bytes). Minimum size is {self.MIN_FILE_SIZE_BYTES} bytes.",
-                ErrorCode.IMAGE_TOO_SMALL
-            )
+            raise ImageValidationError.too_small(file_size, self.MIN_FILE_SIZE_BYTES)
         
         max_size_bytes = self.max_file_size_mb * 1024 * 1024
         if file_size > max_size_bytes:
@@ -102,19 +171,28 @@ class ImageValidator:
                 f"Image file too large ({file_size / (1024*1024):.1f}MB). Maximum size is {self.max_file_size_mb}MB.",
                 ErrorCode.IMAGE_TOO_LARGE
             )
+        
+        return file_size
     
-    def _load_and_validate_format(self, image_data: bytes, filename: Optional[str] = None) -> Image.Image:
+    def _load_and_validate_format(self, image_data: ImageData, filename: Optional[str] = None) -> Image.Image:
         """Load image and validate format."""
+        # Sniff the header so unknown data never reaches Pillow's plugin chain
+        header = bytes(image_data[:8])
+        formats = self._pil_formats
+        for image_format, signature in self._signatures:
+            if header.startswith(signature):
+                formats = (image_format,)
+                break
+        else:
+            if self._reject_unknown_headers:
+                raise ImageValidationError.unsupported_format(self._supported_list)
+        
         try:
-            image = Image.open(io.BytesIO(image_data))
+            image = Image.open(io.BytesIO(image_data), formats=formats)
             
             # Validate format
             if image.format not in self.supported_formats:
-                supported_list = ", ".join(sorted(self.supported_formats))
-                raise ImageValidationError(
-                    f"Unsupported image format '{image.format}'. Supported formats: {supported_list}",
-                    ErrorCode.UNSUPPORTED_FORMAT
-                )
+                raise ImageValidationError.unsupported_format(self._supported_list, image.format)
             
             return image
             
@@ -138,52 +216,58 @@ class ImageValidator:
                 ErrorCode.RESOLUTION_TOO_LOW
             )
     
-    def _validate_image_content(self, image: Image.Image, filename: Optional[str] = None) -> None:
+    def _validate_image_content(self, image: Image.Image, filename: Optional[str] = None,
+                                image_data: Optional[ImageData] = None) -> None:
         """Validate that image is not blank or corrupted."""
         try:
-            # Convert to RGB if needed for analysis
-            if image.mode not in ('RGB', 'L'):
-                analysis_image = image.convert('RGB')
-            else:
-                analysis_image = image
-            
-            # Check if image is blank (all pixels same color or very low variance)
-            stat = ImageStat.Stat(analysis_image)
-            
-            # For grayscale, check single channel variance
-            if analysis_image.mode == 'L':
-                variance = stat.var[0]
-                if variance < 1:  # Very low variance indicates blank image
-                    raise ImageValidationError(
-                        "Image appears to be blank or has insufficient content variation",
-                        ErrorCode.BLANK_IMAGE
-                    )
-            else:
-                # For RGB, check if any channel has reasonable variance
-                max_variance = max(stat.var)
-                if max_variance < 1:
-                    raise ImageValidationError(
-                        "Image appears to be blank or has insufficient content variation",
-                        ErrorCode.BLANK_IMAGE
-                    )
+            # Large JPEGs are first decoded by libjpeg at 1/2, 1/4 or 1/8 scale. Block
+            # averaging can only lower variance, so a draft with enough variance proves
+            # the image is not blank; a draft that looks blank is rechecked at full size.
+            if (image.format == "JPEG" and image_data is not None
+                    and (image.width > _ANALYSIS_DRAFT_SIZE[0] * 2
+                         or image.height > _ANALYSIS_DRAFT_SIZE[1] * 2)):
+                draft_image = Image.open(io.BytesIO(image_data), formats=("JPEG",))
+                draft_image.draft(draft_image.mode, _ANALYSIS_DRAFT_SIZE)
+                if not self._looks_blank(draft_image):
+                    return
+            
+            if self._looks_blank(image):
+                raise ImageValidationError(
+                    "Image appears to be blank or has insufficient content variation",
+                    ErrorCode.BLANK_IMAGE
+                )
             
         except Exception as e:
             if isinstance(e, ImageValidationError):
                 raise
-            logger.warning(f"Could not analyze image content: {e}")
+            logger.warning("Could not analyze image content: %s", e)
             # Don't fail validation for content analysis issues
     
+    def _looks_blank(self, image: Image.Image) -> bool:
+        """Whether every band has near-zero variance (all pixels about one color).
+        
+        One histogram pass covers flat images too: a band spanning at most one
+        level has variance <= 0.25. Grayscale has one band; for RGB, any channel
+        with variance is enough.
+        """
+        # Convert to RGB if needed for analysis
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        return _band_variances(image).max() < 1
+    
     def _get_normalized_info(self, image: Image.Image) -> Dict[str, Any]:
         """Get normalized image information for processing pipeline."""
+        width, height = size = image.size
+        mode = image.mode
         return {
-            "original_size": image.size,
-            "aspect_ratio": image.size[0] / image.size[1],
-            "pixel_count": image.size[0] * image.size[1],
-            "color_mode": image.mode,
-            "has_transparency": image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+            "original_size": size,
+            "aspect_ratio": width / height,
+            "pixel_count": width * height,
+            "color_mode": mode,
+            "has_transparency": mode in ('RGBA', 'LA') or 'transparency' in image.info
         }
     
-    def normalize_image(self, image_data: bytes) -> Tuple[bytes, Dict[str, Any]]:
+    def normalize_image(self, image_data: ImageData) -> Tuple[bytes, Dict[str, Any]]:
         """Normalize image for processing pipeline.
         
         Args:
@@ -193,22 +277,27 @@ class ImageValidator:
             Tuple of (normalized_image_bytes, normalization_info)
         """
         try:
-            image = Image.open(io.BytesIO(image_data))
+            if not isinstance(image_data, bytes):
+                image_data = bytes(image_data)
+            image = Image.open(io.BytesIO(image_data), formats=self._pil_formats)
+            original_mode = image.mode
             
             # Convert to RGB if needed (removes alpha channel, standardizes format)
-            if image.mode != 'RGB':
+            if original_mode != 'RGB':
                 image = image.convert('RGB')
             
             # Save normalized image
             output_buffer = io.BytesIO()
-            image.save(output_buffer, format='JPEG', quality=95, optimize=True)
+            # Single-pass encode (no Huffman optimization pass); 4:4:4 keeps full chroma detail
+            image.save(output_buffer, format='JPEG', quality=self.jpeg_quality,
+                       optimize=False, subsampling=0, progressive=False)
             normalized_bytes = output_buffer.getvalue()
             
             normalization_info = {
-                "original_mode": Image.open(io.BytesIO(image_data)).mode,
+                "original_mode": original_mode,
                 "normalized_mode": "RGB",
                 "normalized_format": "JPEG",
-                "size_reduction": len(image_data) - len(normalized_bytes)
+                "size_reduction": _byte_length(image_data) - len(normalized_bytes)
             }
             
             return normalized_bytes, normalization_info